@@ -1 +1,6 @@
+from .config import CONFIG
+from .log_utils import setup_queue_logging
+
+setup_queue_logging(__name__, CONFIG.log_level)
+
 from . import agent
@@ -1,39 +1,74 @@
-import os
-import json
-import subprocess # For launching listener.py
-import threading  # For the internal Pub/Sub listener thread
-import queue      # For passing messages from internal listener to main agent logic
-import atexit
-import datetime
+import threading
+import logging
+import re
 
 from google.adk.agents import Agent
-from dotenv import load_dotenv
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+from pydantic import PrivateAttr
 from typing import Dict, Any, Optional
 from .version_control_agent import VERSION_CONTROL_TOOL_FUNCTIONS
-from .build_orchestration_agent import BUILD_AGENT_TOOL_FUNCTIONS, generate_signed_url_for_build
+from .build_orchestration_agent import BUILD_AGENT_TOOL_FUNCTIONS, generate_signed_url_for_build, warm_publisher
 from .asset_preview_agent import ASSET_AGENT_TOOL_FUNCTIONS
+from .build_status_service import get_build_status_service
+from .tool_utils import run_in_thread
 
-load_dotenv() # Load environment variables from .env file
+logger = logging.getLogger(__name__)
 
-# --- Configuration for Google Cloud ---
-GOOGLE_CLOUD_PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT_ID")
 # Define the model for agents
 MODEL_GEMINI_2_0_FLASH = "gemini-2.0-flash"
 
+# --- Root routing fast path ---
+# A message that opens by asking for a build and names both the commit SHA and the branch
+# ("build 1fe522b on main", "please rebuild commit 1fe522b566d2 on branch dev") needs nothing
+# from the VersionControlAgent, so the root agent transfers it to the BuildOrchestrationAgent
+# without an LLM call. Everything else goes to the model: requests without a SHA or branch
+# ("build it", "build the latest on dev") need the VersionControlAgent to resolve them first,
+# and messages that ask about a build ("build status?", "build failed?") or about assets
+# ("build my asset bundle") are excluded by the first lookahead, across lines too.
+BUILD_AGENT_NAME = "BuildOrchestrationAgent"
+BUILD_REQUEST_PATTERN = re.compile(
+    r"^\s*(?:(?:please|can you|could you|i want to|i'd like to)\s+)*(?:re)?build\b"
+    r"(?!.*\b(?:status|queued?|progress|fail(?:ed|ing|s)?|broken|done|finished|succeed(?:ed|s)?|"
+    r"complete[ds]?|ready|result|logs?|assets?|bundles?|lists?)\b)"
+    # A commit SHA: 7-40 hex characters with at least one digit, so words like "defaced" don't count
+    r"(?=.*\b(?=[0-9a-f]*[0-9])[0-9a-f]{7,40}\b)"
+    # A branch: "on <name>" or "branch <name>", where the name isn't a placeholder
+    r"(?=.*\b(?:on|branch)\s+(?!(?:the|a|my|latest|head|it)\b)[\w./-]+)",
+    re.IGNORECASE | re.DOTALL,
+)
+# Small talk the orchestrator always declines ("tell me a joke", "write a poem", "what's the weather").
+# Answered with OUT_OF_SCOPE_REPLY without an LLM call; anything not matched still goes to the model.
+OUT_OF_SCOPE_PATTERN = re.compile(
+    r"^\s*(?:(?:please|can you|could you)\s+)*"
+    r"(?:tell me a (?:joke|story)|write (?:me )?a (?:poem|song|story)|what(?:'s| is) the weather)\b",
+    re.IGNORECASE,
+)
+OUT_OF_SCOPE_REPLY = (
+    "Sorry, I can't help with that. I can build the Unity game, check build status, "
+    "answer questions about branches and commits, and help you preview assets in the game."
+)
+
+# Wrapper for get_asset_signed_url, imported from build orchestration agent
+def get_asset_signed_url_tool(branch: str, commit: str,) -> str:
+    """
+    Produces a signed url from a Google Cloud Store bucket path.
+    Reports the url.
+    Args:
+        build_id: The build_id for the requested build
+    Returns:
+        signed_url: The signed url where the user can access the asset
+    """
+    return generate_signed_url_for_build(branch, commit)
+
 class UnityAutomationOrchestrator(Agent):
     """
     The central agent for Unity game development automation.
     This agent orchestrates various tasks related to Unity builds and management.
     """
 
-    listener_process: Optional[subprocess.Popen] = None # subprocess.Popen object
-    listener_stderr_file_handle: Optional[Any] = None # File handle for listener's stderr
-    stdout_reader_thread: Optional[threading.Thread] = None # Thread reading from subprocess stdout
-    _stop_event: threading.Event # Signal for graceful thread shutdown
-    
-    build_status_queue: queue.Queue # Queue for raw JSON from subprocess stdout
-    current_build_statuses: Dict[str, Dict[str, Any]] # Use commit hash as the primary key for caching purposes
-    current_asset_bundle_statuses: Dict[str, Dict[str, Any]] # Use session id as the primary key
+    _status_service: Any = PrivateAttr(default=None) # Process-wide BuildStatusService, shared by every instance
 
     # Needed for pydantic to not complain
     model_config = {"arbitrary_types_allowed": True}
@@ -51,47 +86,14 @@ class UnityAutomationOrchestrator(Agent):
         """
         Initializes the UnityAutomationOrchestrator.
         """
-        # Initialize the complex objects that Pydantic can't construct directly.
-        # These are then passed to super().__init__ as kwargs so Pydantic assigns them.
-        initial_build_status_queue = queue.Queue()
-        initial_current_build_statuses = {}
-        initial_current_asset_bundle_statuses = {}
-
-        # Register the shutdown method here when the orchestrator is created
-        atexit.register(self.shutdown)
+        # One completion listener and status table per process, however many times the agent is built;
+        # the service registers its own shutdown the first time it starts
+        status_service = get_build_status_service()
 
-        # Wrapper for get_build_status.
-        def get_build_status_tool(requestedCommit: Optional[str] = None) -> dict:
-            """
-            Retrieves the most recent build status. Ex: 'nobuild', 'success', 'failed'.
-            If the user specifies a commit, look for that build. If not, look for the
-            latest build they triggered. 
-            
-            Args:
-                requestedCommit: optional, to ask for a certain commit's status
-            Returns:
-                dict: A dictionary containing the status of the requested build(s).
-            """
-            return self.get_build_status(requestedCommit==requestedCommit)
-        
-        # Wrapper for get_asset_signed_url, imported from build orchestration agent
-        def get_asset_signed_url_tool(branch: str, commit: str,) -> str:
-            """
-            Produces a signed url from a Google Cloud Store bucket path.
-            Reports the url.
-            Args:
-                build_id: The build_id for the requested build
-            Returns:
-                signed_url: The signed url where the user can access the asset
-            """
-            return generate_signed_url_for_build(branch, commit)
-
-        
-        # Set tools up in the init
-        if tools is None:
-            tools = []
-        tools.append(get_build_status_tool) # Add the wrapped function here
-        tools.append(get_asset_signed_url_tool)
+        # Set tools up in the init; a new list, so the caller's list is never mutated.
+        # get_build_status is a bound method: ADK builds the schema without `self`
+        # URL signing blocks on GCS, so the signed-URL tool runs on a worker thread like the build agent's
+        tools = [*(tools or ()), status_service.get_build_status, run_in_thread(get_asset_signed_url_tool)]
 
         # Pass all arguments, including your custom internal state, to the base Agent constructor.
         # Pydantic will handle the assignment to the declared fields.
@@ -102,199 +104,66 @@ class UnityAutomationOrchestrator(Agent):
             instruction=instruction,
             tools=tools,
             sub_agents=sub_agents,
-            build_status_queue=initial_build_status_queue,
-            current_build_statuses=initial_current_build_statuses,
-            current_asset_bundle_statuses=initial_current_asset_bundle_statuses,
+            before_model_callback=self._route_build_requests,
             **kwargs # Pass any remaining kwargs
         )
 
-        # Initialize other custom internal state *directly on self*
-        # after the super().__init__ call has completed.
-        # These are instance attributes that are not passed to the Pydantic base model's __init__.
-        self._stop_event = threading.Event()
-        self.start_external_listener_subprocess()
-        print(f"UnityAutomationOrchestrator initialized with name: {self.name}")
- 
-    def get_build_status(self, requestedCommit: Optional[str] = None) -> Dict[str, Any]:
-        """
-        Retrieves the build status. Ex: 'nobuild', 'success', 'failed'.
+        # Private attributes are created by Pydantic during super().__init__, so set them after
+        self._status_service = status_service
+        # Pay the first publish's connection/auth setup now, not on the user's first build
+        threading.Thread(target=warm_publisher, name="publisher-warmup", daemon=True).start()
+        logger.info("UnityAutomationOrchestrator initialized with name: %s", self.name)
 
-        Args:
-            requestedCommit: the user can optionally request the build status of a specific commit
-        Returns:
-            dict: A dictionary containing the status of the requested build(s).
-        """ 
-        if not self.current_build_statuses or len(self.current_build_statuses) == 0:
-            return {"message": "No build status information available."}
+    @property
+    def current_build_statuses(self):
+        """Latest BuildStatus per commit, from the shared service. Guarded by its lock."""
+        return self._status_service.current_build_statuses
 
-        # --- Retrieve status from the current_build_statuses dictionary ---
-        if isinstance(requestedCommit, str) and requestedCommit.strip():
-            status_info = self.current_build_statuses.get(requestedCommit)
-            if status_info:
-                return {
-                    "status": status_info.get('status', 'unknown'),
-                }
-            return {"requestedCommit": requestedCommit, "status": "not_found", "message": f"Build for commit '{requestedCommit}' status not found or not yet processed."}
-        else: 
-            # Find latest build by timestamp
-            latest_commit = None
-            latest_timestamp = None
-            for commit, info in self.current_build_statuses.items():
-                timestamp_str = info.get('timestamp')
-                if timestamp_str:
-                    try:
-                        timestamp = datetime.datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                        if latest_timestamp is None or timestamp > latest_timestamp:
-                            latest_timestamp = timestamp
-                            latest_commit = commit
-                    except Exception as e:
-                        print(f"Warning: Could not parse timestamp for commit {commit}: {e}")
+    @property
+    def current_asset_bundle_statuses(self):
+        """Latest notification per asset bundle session, from the shared service. Guarded by its lock."""
+        return self._status_service.current_asset_bundle_statuses
 
-            if latest_commit is None:
-                return {"message": "No valid timestamp found for builds."}
+    def build_statuses_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return self._status_service.build_statuses_snapshot()
 
-            # Return status for latest commit
-            status_info = self.current_build_statuses.get(latest_commit)
-            return {
-                "commit": latest_commit,
-                "status": status_info.get('status', 'unknown'),
-            }
+    def asset_bundle_statuses_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return self._status_service.asset_bundle_statuses_snapshot()
 
-    def start_external_listener_subprocess(self):
+    def _route_build_requests(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
         """
-        Launches listener.py as a separate, long-running process and starts
-        a thread to continuously read its stdout.
+        Before-model callback. Answers a fresh build request with a transfer to the
+        BuildOrchestrationAgent directly, and declines known out-of-scope requests,
+        skipping the routing LLM call. Returns None (let the model decide) for everything else.
         """
-        listener_script_path = os.path.join(os.path.dirname(__file__), 'listener.py')
-        
-        try:
-            # Open stderr to a file for debugging
-            self.listener_stderr_file_handle = open("listener_stderr.log", "a")
-            
-            self.listener_process = subprocess.Popen(
-                ["python", listener_script_path],
-                stdout=subprocess.PIPE,
-                stderr=self.listener_stderr_file_handle,
-                text=True, # Decode stdout/stderr as text
-                bufsize=1, # Line-buffered output for stdout
+        if not llm_request.contents:
+            return None
+        latest = llm_request.contents[-1]
+        # Only the user's own text; function responses also arrive with role "user"
+        if latest.role != "user" or not latest.parts:
+            return None
+        text = "".join(part.text or "" for part in latest.parts)
+        if OUT_OF_SCOPE_PATTERN.match(text):
+            return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=OUT_OF_SCOPE_REPLY)]))
+        if not BUILD_REQUEST_PATTERN.match(text):
+            return None
+
+        logger.debug("Routing build request straight to %s", BUILD_AGENT_NAME)
+        return LlmResponse(
+            content=types.Content(
+                role="model",
+                parts=[types.Part(function_call=types.FunctionCall(
+                    name="transfer_to_agent",
+                    args={"agent_name": BUILD_AGENT_NAME},
+                ))],
             )
-            print(f"Launched listener.py process with PID: {self.listener_process.pid}")
-
-            # Start a thread to read stdout from the listener process
-            self.stdout_reader_thread = threading.Thread(target=self._read_listener_stdout, daemon=True)
-            self.stdout_reader_thread.start()
-            print("Started stdout reader thread for listener process.")
-
-        except FileNotFoundError:
-            print(f"Error: Python interpreter or listener.py not found at {listener_script_path}.")
-            if self.listener_stderr_file_handle:
-                self.listener_stderr_file_handle.close()
-            self.listener_stderr_file_handle = None
-        except Exception as e:
-            print(f"An error occurred while launching listener.py: {e}")
-            if self.listener_stderr_file_handle:
-                self.listener_stderr_file_handle.close()
-            self.listener_stderr_file_handle = None
-   
-    def _read_listener_stdout(self):
-        """
-        Continuously reads lines from the listener.py's stdout, parses them as JSON,
-        and places them into self.build_status_queue. This runs in a separate thread.
-        """
-
-        # example incoming message. for a build completion message
-        # $completionPayload = @{
-        #         session_id = "123..."
-        #         commit = $commitHash
-        #         branch = $branchName
-        #         status = "success"
-        #         is_test_build = $isTestBuild
-        #         gcs_path = $finalGcsPath
-        #         timestamp = (Get-Date -Format 'yyyy-MM-ddTHH:mm:ssZ')
-        #         build_id = $receivedBuildId
-        #     }
-
-        if not self.listener_process or not self.listener_process.stdout:
-            print("Listener process or its stdout not initialized. Cannot read stdout.")
-            return
-
-        print("Stdout reader thread started, waiting for output from listener.py...")
-        while not self._stop_event.is_set():
-            try:
-                line = self.listener_process.stdout.readline()
-                if line:
-                    line = line.strip()
-                    if line: # Ensure the line is not empty after stripping
-                        print(f"[Listener STDOUT]: {line}") # For debugging
-                        try:
-                            notification = json.loads(line) # TODO: verify type etc
-                            commit_hash = notification.get('commit')
-                            session_id = notification.get('session_id')
-                            if commit_hash:
-                                # Update the orchestrator's internal build status dictionary with the latest status
-                                self.current_build_statuses[commit_hash] = notification
-                                print(f"  Processed update for commit: {commit_hash}, Status: {notification.get('status', 'N/A')}")
-                            elif session_id:
-                                # Update asset bundle status instead
-                                self.current_asset_bundle_statuses[session_id] = notification
-                                print(f"  Processed update for asset bundle for session: {session_id}, Status: {notification.get('status', 'N/A')}")
-                            else:
-                                print("Build status notif has neither commit hash nor session id")
-
-                        except json.JSONDecodeError as e:
-                            print(f"Failed to decode JSON from listener stdout: {line} - Error: {e}")
-                else:
-                    # If readline returns an empty string, the subprocess has likely exited.
-                    if self.listener_process.poll() is not None:
-                        print("Listener process has exited. Stopping stdout reader thread.")
-                        break
-                    # Small delay to prevent busy-waiting if no output
-                    self._stop_event.wait(0.1) 
-            except Exception as e:
-                print(f"Error reading from listener stdout: {e}")
-                break # Exit the thread on error
-
-        print("Stdout reader thread stopping.")
-
-    def shutdown(self):
-        """
-        Gracefully shuts down the listener subprocess and reader thread.
-        """
-        print("Initiating UnityAutomationOrchestrator shutdown...")
-        # Signal the stdout reader thread to stop
-        self._stop_event.set()
-
-        # Terminate the listener process if it's running
-        if self.listener_process and self.listener_process.poll() is None:
-            print("Terminating listener.py process...")
-            self.listener_process.terminate()
-            try:
-                self.listener_process.wait(timeout=5) # Wait for process to terminate
-            except subprocess.TimeoutExpired:
-                print("Listener process did not terminate gracefully, killing it.")
-                self.listener_process.kill()
-        
-        # Join the stdout reader thread to ensure it finishes
-        if self.stdout_reader_thread and self.stdout_reader_thread.is_alive():
-            print("Joining stdout reader thread...")
-            self.stdout_reader_thread.join(timeout=5)
-            if self.stdout_reader_thread.is_alive():
-                print("Warning: stdout reader thread did not terminate in time.")
-
-        # Close the stderr file handle
-        if self.listener_stderr_file_handle:
-            self.listener_stderr_file_handle.close()
-            self.listener_stderr_file_handle = None
-            print("Closed listener_stderr.log file handle.")
-
-        print("UnityAutomationOrchestrator shutdown complete.")
-    def _before_agent_callback(self, **kwargs): pass
+        )
 
 
 # Build Orchestration Agent
 build_orchestration_agent = Agent(
     model=MODEL_GEMINI_2_0_FLASH,
-    name="BuildOrchestrationAgent",
+    name=BUILD_AGENT_NAME,
     instruction=(
         "You are the Unity Build specialist. Your role is to manage build requests for the Unity project.\n\n"
         "When a user asks to build the game, follow this structured process:\n\n"
@@ -317,7 +186,8 @@ build_orchestration_agent = Agent(
         "- **If the tool returns `False` (cache miss)**, explicitly say:\n"
         "  - 'This build is not cached. I will now trigger a new build.'\n"
         "  - Then, use the `publish_build_request` tool with the correct `branch`, `commit`, and `is_test_build` values.\n"
-        "  - Inform the user that the build is in progress and may take several minutes.\n\n"
+        "  - Inform the user that the build is in progress and may take several minutes.\n"
+        "- If the user confirms builds for several commits on the same branch, use the `publish_build_requests` tool once with all of the commit hashes instead of calling `publish_build_request` for each.\n\n"
         "5. When a user later asks about build status:\n"
         "- You will NOT handle that — the root UnityOrchestrationAgent handles status tracking and signed URL generation once builds are complete.\n\n"
         "Remember: never trigger a build without confirmation and cache check. Never offer a signed URL unless the build is complete or already cached."
@@ -413,7 +283,7 @@ if build_orchestration_agent and version_control_agent and asset_preview_agent:
                 "You must handle build status questions directly."
                 "- If the user asks about build statuses with phrases like:"
                 "what is the status of the build queue, is build X complete?, did my build finish?, is the test build done?"
-                "or similar, always call the `get_build_status_tool` to get the latest information."
+                "or similar, always call the `get_build_status` tool to get the latest information."
                 "- If the user does NOT specify a commit hash, treat the request as about the *most recent build*."
                 "- If the build status is success or complete, offer the user a signed URL to download the build by asking:"
                 "Would you like a signed URL to download this build?"
@@ -1,24 +1,35 @@
-import json
-import uuid
+import functools
+import logging
 import os
+import time
 from datetime import datetime, timedelta, timezone
 
-from dotenv import load_dotenv
 from urllib.parse import quote, quote_plus
-from google.cloud import pubsub_v1, storage
 from google.adk.tools import ToolContext, FunctionTool
+from .build_orchestration_agent import UNITY_BUILD_TOPIC_PATH, UNITY_NOBUILD, get_publisher, new_build_id, on_publish_done, storage_client
+from .config import CONFIG
+from .tool_utils import encode_json, run_in_thread
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
-UNITY_BUILD_PUB_SUB_TOPIC_ID = os.getenv("UNITY_BUILD_PUB_SUB_TOPIC_ID")
-GCS_BUILD_BUCKET_NAME = os.getenv("GCS_BUILD_BUCKET_NAME")
-APP_BASE_URL = os.getenv("APP_BASE_URL", "http://localhost:8000")
-APP_MODE = os.getenv("APP_MODE", "web")  # default to web mode
+GOOGLE_CLOUD_PROJECT = CONFIG.google_cloud_project
+GCS_BUILD_BUCKET_NAME = CONFIG.gcs_build_bucket_name
+APP_BASE_URL = CONFIG.app_base_url
+APP_MODE = CONFIG.app_mode
 
 RUNNING_IN_TERMINAL = APP_MODE == "terminal"
 
-storage_client = storage.Client(project=GOOGLE_CLOUD_PROJECT)
+DUMMY_GLB_PATH = "multi_tool_agent/dummy_glb/example.glb"  # local dummy file path
+PATH_CHECK_WINDOW_SECONDS = 30
+
+@functools.lru_cache(maxsize=8)
+def _path_ok(path: str, _epoch: int) -> bool:
+    """os.path.exists, memoized per time window. _epoch buckets the monotonic clock
+    so a cached answer is reused for at most PATH_CHECK_WINDOW_SECONDS."""
+    return os.path.exists(path)
+
+def _epoch() -> int:
+    return int(time.monotonic() // PATH_CHECK_WINDOW_SECONDS)
 
 def get_session_id(tool_context: ToolContext):
     return tool_context._invocation_context.session.id
@@ -38,12 +49,11 @@ def publish_asset_build_request(
         session_id
 
     Returns:
-        dict: Status and message or error details.
+        dict: "submitted" status and the build_id once the request is queued for
+        publishing, or error details.
     """
-    publisher = pubsub_v1.PublisherClient()
-    topic_path = publisher.topic_path(GOOGLE_CLOUD_PROJECT, UNITY_BUILD_PUB_SUB_TOPIC_ID)
 
-    build_id = str(uuid.uuid4())
+    build_id = new_build_id()
 
     gcs_asset_location_url = (
         f"gs://{GCS_BUILD_BUCKET_NAME}/user-asset-files/{session_id}/assets/"
@@ -58,18 +68,21 @@ def publish_asset_build_request(
         "session_id": session_id  
     }
 
-    data_bytes = json.dumps(message_data).encode('utf-8')
-    attributes = {}
+    # Encode the payload once; the same compact JSON is logged below
+    data_bytes = encode_json(message_data)
 
     try:
-        print(f"--- Tool: publish_asset_build_request for build_id: '{build_id}' ---")
-        print(f"Payload: {json.dumps(message_data, indent=2)}")
-        future = publisher.publish(topic_path, data=data_bytes, **attributes)
-        message_id = future.result()
-        print(f"SUCCESS: Published message with Pub/Sub message ID: {message_id}")
-        return {"status": "success", "build_id": build_id, "message_id": message_id}
+        if logger.isEnabledFor(logging.DEBUG): # Decoding the payload echo isn't free
+            logger.debug("Queueing asset build request %s: %s", build_id, data_bytes.decode('utf-8'))
+        if UNITY_NOBUILD:
+            logger.info("UNITY_NOBUILD=1, not publishing asset build request %s", build_id)
+            return {"status": "submitted", "build_id": build_id}
+        # Don't wait for the ack; the outcome is reported from the publisher's thread
+        future = get_publisher().publish(UNITY_BUILD_TOPIC_PATH, data=data_bytes)
+        future.add_done_callback(on_publish_done(build_id))
+        return {"status": "submitted", "build_id": build_id}
     except Exception as e:
-        print(f"ERROR: Failed to publish message: {e}")
+        logger.error("Failed to publish message: %s", e)
         return {"status": "error", "message": str(e)}
 
 def upload_dummy_glb_and_get_signed_url(session_id: str):
@@ -78,10 +91,8 @@ def upload_dummy_glb_and_get_signed_url(session_id: str):
     then generate a signed PUT URL for it. Used for terminal version of app
     """
 
-    dummy_path = "multi_tool_agent/dummy_glb/example.glb"  # local dummy file path
-
-    if not os.path.exists(dummy_path):
-        print(f"No glb file found at {dummy_path}")
+    if not _path_ok(DUMMY_GLB_PATH, _epoch()):
+        logger.error("No glb file found at %s", DUMMY_GLB_PATH)
         return
     
     dest_blob_path = f"user-asset-files/{session_id}/assets/my-asset.glb"
@@ -90,15 +101,14 @@ def upload_dummy_glb_and_get_signed_url(session_id: str):
     blob = bucket.blob(dest_blob_path)
 
     # Upload the file to GCS (overwrite if exists)
-    blob.upload_from_filename(dummy_path)
-    print(f"Uploaded dummy GLB to gs://{GCS_BUILD_BUCKET_NAME}/{dest_blob_path}")
+    blob.upload_from_filename(DUMMY_GLB_PATH)
+    logger.info("Uploaded dummy GLB to gs://%s/%s", GCS_BUILD_BUCKET_NAME, dest_blob_path)
     
     return dest_blob_path
 
 def generate_signed_put_url(session_id: str) -> tuple[str, str]:
     filename = f"user-asset-files/{session_id}/assets/my-asset.glb"
-    client = storage.Client()
-    blob = client.bucket(GCS_BUILD_BUCKET_NAME).blob(filename)
+    blob = storage_client.bucket(GCS_BUILD_BUCKET_NAME).blob(filename)
 
     signed_url = blob.generate_signed_url(
         version="v4",
@@ -125,7 +135,7 @@ def generate_upload_url(session_id: str) -> str:
     signed_url, filename = generate_signed_put_url(session_id)
     upload_url_base = f"{APP_BASE_URL}/api/upload?"
     upload_url = f"{upload_url_base}session_id={quote(str(session_id))}&signed_url={quote_plus(str(signed_url))}&gcs_path={quote_plus(str(filename))}"
-    print(f"Generated upload URL: ", upload_url)
+    logger.debug("Generated upload URL: %s", upload_url)
     
     #html = f'<a href="{upload_url}" target="_blank" rel="noopener noreferrer">Click here to upload your .glb file</a>'
 
@@ -147,7 +157,7 @@ def generate_signed_url_for_bundle(session_id: str, expiration_minutes: int = 60
     if not GCS_BUILD_BUCKET_NAME:
         return "Error: GCS_BUILD_BUCKET_NAME environment variable not set. Cannot generate URL."
 
-    print(f"[GCS Tool] Generating signed URL for asset for session {session_id}...")
+    logger.debug("[GCS Tool] Generating signed URL for asset for session %s...", session_id)
     try:
         bucket = storage_client.bucket(GCS_BUILD_BUCKET_NAME)
         blob_name = f"game-builds/assets/{session_id}/assets.zip"
@@ -158,14 +168,15 @@ def generate_signed_url_for_bundle(session_id: str, expiration_minutes: int = 60
 
         expiration_time = datetime.now(tz=timezone.utc) + timedelta(minutes=expiration_minutes)
         url = blob.generate_signed_url(expiration=expiration_time)
-        print(f"[GCS Tool] Generated signed URL (valid for {expiration_minutes} min): {url}")
+        logger.debug("[GCS Tool] Generated signed URL (valid for %d min): %s", expiration_minutes, url)
         return url
     except Exception as e:
-        print(f"Error generated signed asset bundle url: {e}")
+        logger.error("Error generated signed asset bundle url: %s", e)
     
+# URL signing and uploads block on GCS, so those tools run on a worker thread
 ASSET_AGENT_TOOL_FUNCTIONS = [
     publish_asset_build_request,
     get_session_id_tool,
-    generate_upload_url,
-    generate_signed_url_for_bundle
+    run_in_thread(generate_upload_url),
+    run_in_thread(generate_signed_url_for_bundle)
 ]
\ No newline at end of file
@@ -1,20 +1,140 @@
-import json
-import uuid
+import atexit
+import logging
 import os
+import threading
 from datetime import datetime, timedelta, timezone
+from typing import List
 from .version_control_agent import get_latest_commit_on_branch
+from .config import CONFIG, PUBSUB_CLIENT_OPTIONS
+from .tool_utils import encode_json, run_in_thread
 
-from dotenv import load_dotenv
-from google.cloud import pubsub_v1, storage
+from google.cloud import storage
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
-UNITY_BUILD_PUB_SUB_TOPIC_ID = os.getenv("UNITY_BUILD_PUB_SUB_TOPIC_ID")
-GCS_BUILD_BUCKET_NAME = os.getenv("GCS_BUILD_BUCKET_NAME")
+GOOGLE_CLOUD_PROJECT = CONFIG.google_cloud_project
+UNITY_BUILD_PUB_SUB_TOPIC_ID = CONFIG.unity_build_topic_id
+GCS_BUILD_BUCKET_NAME = CONFIG.gcs_build_bucket_name
+UNITY_NOBUILD = CONFIG.unity_nobuild
+
+# Publisher batching: build requests arrive one at a time, so keep the
+# flush latency low; bursts still coalesce into a single publish RPC.
+PUBLISH_BATCH_MAX_MESSAGES = 100
+PUBLISH_BATCH_MAX_BYTES = 1024 * 1024 # 1 MiB
+PUBLISH_BATCH_MAX_LATENCY_SECONDS = 0.05
 
 storage_client = storage.Client(project=GOOGLE_CLOUD_PROJECT)
 
+# One publisher for the process: it owns the gRPC channel, credentials and
+# batching threads, which are expensive to rebuild on every publish. Created on
+# first publish so importing the agents doesn't pay for it; pubsub_v1 (gRPC and
+# protobuf) is imported at that point too.
+_publisher = None
+_publisher_lock = threading.Lock()
+
+def get_publisher():
+    """Returns the shared pubsub_v1.PublisherClient, creating it on first use."""
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                from google.cloud import pubsub_v1
+                client = pubsub_v1.PublisherClient(
+                    batch_settings=pubsub_v1.types.BatchSettings(
+                        max_messages=PUBLISH_BATCH_MAX_MESSAGES,
+                        max_bytes=PUBLISH_BATCH_MAX_BYTES,
+                        max_latency=PUBLISH_BATCH_MAX_LATENCY_SECONDS,
+                    ),
+                    client_options=PUBSUB_CLIENT_OPTIONS,
+                )
+                atexit.register(client.stop) # Flush any pending batches on shutdown
+                _publisher = client
+    return _publisher
+
+# Build and asset requests share one topic; resolve its path once instead of on every publish
+UNITY_BUILD_TOPIC_PATH = f"projects/{GOOGLE_CLOUD_PROJECT}/topics/{UNITY_BUILD_PUB_SUB_TOPIC_ID}"
+
+def warm_publisher():
+    """Creates the shared publisher and makes one cheap RPC so the channel, TLS session
+    and auth token are ready before the first build request. Meant for a background thread."""
+    if UNITY_NOBUILD:
+        return
+    try:
+        get_publisher().get_topic(request={"topic": UNITY_BUILD_TOPIC_PATH}, timeout=10)
+        logger.info("Pub/Sub publisher warmed up for %s", UNITY_BUILD_TOPIC_PATH)
+    except Exception as e:
+        # A PermissionDenied (publisher-only role) still leaves the connection warm
+        logger.info("Pub/Sub warm-up call for %s failed: %s", UNITY_BUILD_TOPIC_PATH, e)
+
+def on_publish_done(build_id: str):
+    """Returns a done-callback that reports the outcome of a publish once Pub/Sub acks it.
+    Runs on the publisher's batching thread, so the tool call never waits on the RPC."""
+    def callback(future):
+        try:
+            logger.debug("Published build_id '%s' with Pub/Sub message ID: %s", build_id, future.result())
+        except Exception as e:
+            logger.error("Failed to publish build_id '%s': %s", build_id, e)
+    return callback
+
+# Build ids are sliced from a pool of random bytes drawn in one syscall per
+# BUILD_ID_POOL_IDS ids. The pool is dropped in forked children so a parent
+# and child never hand out the same ids.
+BUILD_ID_BYTES = 16
+BUILD_ID_POOL_IDS = 256
+_build_id_pool = b""
+_build_id_offset = 0
+_build_id_lock = threading.Lock()
+
+def _reset_build_id_pool():
+    global _build_id_pool, _build_id_offset
+    _build_id_pool = b""
+    _build_id_offset = 0
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_build_id_pool)
+
+def new_build_id() -> str:
+    """Returns a random 128-bit id for a build request, as 32 hex chars.
+    At least as random as uuid4, without building a UUID object for every publish."""
+    global _build_id_pool, _build_id_offset
+    with _build_id_lock:
+        if _build_id_offset + BUILD_ID_BYTES > len(_build_id_pool):
+            _build_id_pool = os.urandom(BUILD_ID_BYTES * BUILD_ID_POOL_IDS)
+            _build_id_offset = 0
+        pool, start = _build_id_pool, _build_id_offset
+        _build_id_offset += BUILD_ID_BYTES
+    return pool[start:start + BUILD_ID_BYTES].hex()
+
+def _queue_build_request(command: str, branch_name: str, commit_hash: str, is_test_build: bool) -> str:
+    """Hands one build request to the shared publisher and returns its build_id.
+    Raises if the publisher rejects the message."""
+    build_id = new_build_id() # unique hash for this build request
+
+    # Create a structured dictionary for the payload
+    message_data = {
+        "build_id": build_id, 
+        "command": command,
+        "branch_name": branch_name,
+        "commit_hash": commit_hash,
+        "is_test_build": is_test_build,
+        "request_timestamp": datetime.now().isoformat(), # Add timestamp for logging/tracking
+    }
+
+    # Encode the payload once; the same compact JSON is logged below. Pub/Sub
+    # carries these bytes as-is, so there is no Base64 step on the way out.
+    data_bytes = encode_json(message_data)
+
+    if logger.isEnabledFor(logging.DEBUG): # Decoding the payload echo isn't free
+        logger.debug("Queueing build request %s: %s", build_id, data_bytes.decode('utf-8'))
+    if UNITY_NOBUILD:
+        logger.info("UNITY_NOBUILD=1, not publishing build request %s", build_id)
+        return build_id
+    # Don't wait for the ack: the build_id is generated client-side, and waiting
+    # would put a Pub/Sub round trip on every tool call and defeat batching.
+    future = get_publisher().publish(UNITY_BUILD_TOPIC_PATH, data=data_bytes)
+    future.add_done_callback(on_publish_done(build_id))
+    return build_id
+
 def publish_build_request(
     command: str,
     branch_name: str,
@@ -33,37 +153,56 @@ def publish_build_request(
         is_test_build (bool): If True, indicates a test build (no actual Unity build).
 
     Returns:
-        dict: Status and message or error details.
+        dict: "submitted" status and the build_id once the request is queued for
+        publishing, or error details.
     """
-    publisher = pubsub_v1.PublisherClient()
-    topic_path = publisher.topic_path(GOOGLE_CLOUD_PROJECT, UNITY_BUILD_PUB_SUB_TOPIC_ID)
+    try:
+        build_id = _queue_build_request(command, branch_name, commit_hash, is_test_build)
+        return {"status": "submitted", "build_id": build_id}
+    except Exception as e:
+        logger.error("Failed to publish message: %s", e)
+        return {"status": "error", "message": str(e)}
 
-    build_id = str(uuid.uuid4()) # unique hash for this build request
+def publish_build_requests(
+    command: str,
+    branch_name: str,
+    commit_hashes: List[str],
+    is_test_build: bool,
+) -> dict:
+    """Publishes one build request per commit on a branch in a single call.
 
-    # Create a structured dictionary for the payload
-    message_data = {
-        "build_id": build_id, 
-        "command": command,
-        "branch_name": branch_name,
-        "commit_hash": commit_hash,
-        "is_test_build": is_test_build,
-        "request_timestamp": datetime.now().isoformat(), # Add timestamp for logging/tracking
-    }
+    Use this instead of calling publish_build_request repeatedly when the user
+    confirms several builds at once. The requests are queued together, so the
+    publisher sends them to Pub/Sub in one batch.
 
-    # Encode the dictionary to a JSON string, then to bytes
-    data_bytes = json.dumps(message_data).encode('utf-8')
-    attributes = {}
+    Args:
+        command (str): The primary command for the VM (e.g., "start_build").
+        branch_name (str): The Git branch name to build from.
+        commit_hashes (List[str]): The Git commit hashes to build (full SHAs preferred).
+        is_test_build (bool): If True, indicates test builds (no actual Unity build).
 
-    try:
-        print(f"--- Tool: publish_build_request for build_id: '{build_id}' ---")
-        print(f"Payload: {json.dumps(message_data, indent=2)}") # For better logging
-        future = publisher.publish(topic_path, data=data_bytes, **attributes)
-        message_id = future.result()
-        print(f"SUCCESS: Published message with Pub/Sub message ID: {message_id}")
-        return {"status": "success", "build_id": build_id, "message_id": message_id}
-    except Exception as e:
-        print(f"ERROR: Failed to publish message: {e}")
-        return {"status": "error", "message": str(e)}
+    Returns:
+        dict: "submitted" status and a commit -> build_id mapping for the queued
+        requests, plus error details for any commit that could not be queued.
+    """
+    if not commit_hashes:
+        return {"status": "error", "message": "No commit hashes given; nothing to build."}
+
+    build_ids = {}
+    errors = {}
+    for commit_hash in commit_hashes:
+        try:
+            build_ids[commit_hash] = _queue_build_request(command, branch_name, commit_hash, is_test_build)
+        except Exception as e:
+            logger.error("Failed to publish message for commit %s: %s", commit_hash, e)
+            errors[commit_hash] = str(e)
+
+    if not build_ids:
+        return {"status": "error", "errors": errors}
+    result = {"status": "submitted", "build_ids": build_ids}
+    if errors:
+        result["errors"] = errors
+    return result
     
 def _get_build_object_path(branch: str, commit: str) -> str:
     """Constructs the expected GCS object path for a Unity build artifact
@@ -84,10 +223,10 @@ def check_gcs_cache(branch: str, commit: str) -> bool:
         bool: True if the build is found in cache, False otherwise.
     """
     if not GCS_BUILD_BUCKET_NAME:
-        print("[Cache Tool] GCS_BUILD_BUCKET_NAME environment variable not set. Cannot check cache.")
+        logger.warning("[Cache Tool] GCS_BUILD_BUCKET_NAME environment variable not set. Cannot check cache.")
         return False # Or raise an error, depending on desired strictness
 
-    print(f"[Cache Tool] Checking GCS cache for {branch}/{commit} in bucket '{GCS_BUILD_BUCKET_NAME}'...")
+    logger.info("[Cache Tool] Checking GCS cache for %s/%s in bucket '%s'...", branch, commit, GCS_BUILD_BUCKET_NAME)
     try:
         bucket = storage_client.bucket(GCS_BUILD_BUCKET_NAME)
         # Check for the existence of the main build artifact
@@ -95,10 +234,10 @@ def check_gcs_cache(branch: str, commit: str) -> bool:
         blob = bucket.blob(blob_name)
         
         exists = blob.exists()
-        print(f"[Cache Tool] Build for {branch}/{commit} {'FOUND' if exists else 'NOT FOUND'} in cache.")
+        logger.info("[Cache Tool] Build for %s/%s %s in cache.", branch, commit, 'FOUND' if exists else 'NOT FOUND')
         return exists
     except Exception as e:
-        print(f"ERROR: Failed to check GCS cache: {e}")
+        logger.error("Failed to check GCS cache: %s", e)
         return False
     
 def generate_signed_url_for_build(branch: str, commit: str, expiration_minutes: int = 60) -> str:
@@ -116,7 +255,7 @@ def generate_signed_url_for_build(branch: str, commit: str, expiration_minutes:
     if not GCS_BUILD_BUCKET_NAME:
         return "Error: GCS_BUILD_BUCKET_NAME environment variable not set. Cannot generate URL."
 
-    print(f"[GCS Tool] Generating signed URL for build on {branch}/{commit}...")
+    logger.info("[GCS Tool] Generating signed URL for build on %s/%s...", branch, commit)
     try:
         bucket = storage_client.bucket(GCS_BUILD_BUCKET_NAME)
         # Use the helper to construct the full blob path
@@ -128,14 +267,16 @@ def generate_signed_url_for_build(branch: str, commit: str, expiration_minutes:
 
         expiration_time = datetime.now(tz=timezone.utc) + timedelta(minutes=expiration_minutes)
         url = blob.generate_signed_url(expiration=expiration_time)
-        print(f"[GCS Tool] Generated signed URL (valid for {expiration_minutes} min): {url}")
+        logger.info("[GCS Tool] Generated signed URL (valid for %s min): %s", expiration_minutes, url)
         return url
     except Exception as e:
         return f"Error generating signed URL: {e}"
     
+# GCS and GitHub lookups block on HTTP, so those tools run on a worker thread
 BUILD_AGENT_TOOL_FUNCTIONS = [
     publish_build_request,
-    check_gcs_cache,
-    generate_signed_url_for_build,
-    get_latest_commit_on_branch # borrowed from version control agent
+    publish_build_requests,
+    run_in_thread(check_gcs_cache),
+    run_in_thread(generate_signed_url_for_build),
+    run_in_thread(get_latest_commit_on_branch) # borrowed from version control agent
 ]
\ No newline at end of file
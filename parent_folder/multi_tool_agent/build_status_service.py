@@ -0,0 +1,527 @@
+import atexit
+import collections
+import concurrent.futures
+import datetime
+import logging
+import os
+import selectors
+import signal
+import subprocess # For launching listener.py
+import sys
+import threading
+from typing import Any, Dict, List, Optional
+
+from .config import CONFIG, PUBSUB_CLIENT_OPTIONS
+from .listener import completion_subscription_path, ensure_completion_subscription, json_loads, notification_from_message
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CLOUD_PROJECT_ID = CONFIG.google_cloud_project_id
+
+# --- Build completion listener ---
+# By default completions are received in-process over StreamingPull. LISTENER_MODE=subprocess
+# falls back to running listener.py as a child process and reading its stdout. That mode is
+# POSIX-only (select() on a pipe, non-blocking pipe fds, process groups, O_CLOEXEC); elsewhere
+# the in-process listener is used instead.
+LISTENER_MODE = CONFIG.listener_mode
+# Build statuses kept in memory, oldest-updated evicted first, so a long-running process stays bounded
+MAX_TRACKED_BUILDS = 1000
+MAX_TRACKED_ASSET_BUNDLES = 1000
+# StreamingPull concurrency: callbacks run on our own sized pool instead of the library's
+# default, and flow control bounds how many completions are leased but not yet handled.
+SUBSCRIBER_MAX_WORKERS = max(8, (os.cpu_count() or 1) * 2)
+# Each client holds its own gRPC stream; add clients only when one stream's throughput cap is hit
+SUBSCRIBER_CLIENTS = CONFIG.subscriber_clients
+# Streams per client share its channel; more streams parallelize decode without more connections
+SUBSCRIBER_STREAMS = CONFIG.subscriber_streams
+# A callback is a decode plus a dict write, so a small lease window keeps memory bounded
+# and acks prompt; under a burst the stream pauses instead of hoarding messages.
+# Kept as plain settings: pubsub_v1 (gRPC and protobuf) is only imported once a listener starts.
+SUBSCRIBER_FLOW_CONTROL = dict(
+    max_messages=256,
+    max_bytes=4 * 1024 * 1024, # 4 MiB
+    max_lease_duration=60, # seconds; a handled message is acked well within this
+)
+
+# --- Listener subprocess launch configuration (fixed for the life of the process) ---
+LISTENER_SCRIPT_PATH = os.path.join(os.path.dirname(__file__), 'listener.py')
+LISTENER_COMMAND = [sys.executable, LISTENER_SCRIPT_PATH] # This interpreter, not whatever "python" is on PATH
+# The listener gets only what it needs to reach Pub/Sub, not a copy of the whole environment
+LISTENER_ENV_VARS = (
+    "PATH", "HOME", "PYTHONPATH",
+    "GOOGLE_CLOUD_PROJECT_ID", "GOOGLE_APPLICATION_CREDENTIALS", "CLOUDSDK_CONFIG", "PUBSUB_EMULATOR_HOST",
+    "HTTPS_PROXY", "https_proxy", "NO_PROXY", "no_proxy",
+    "SSL_CERT_FILE", "REQUESTS_CA_BUNDLE", "GRPC_DEFAULT_SSL_ROOTS_FILE_PATH", # Custom CA bundles
+    "LANG", "LC_ALL",
+)
+# The listener narrates every message on stderr; only keep it when debugging
+LISTENER_DEBUG = CONFIG.listener_debug
+LISTENER_STDERR_LOG = "listener_stderr.log"
+LISTENER_STDERR_LOG_MAX_BYTES = 10 * 1024 * 1024 # Rotated to .1 at launch once it grows past this
+# The stdout pipe is drained a pipe-buffer at a time and split into lines here, not per readline()
+LISTENER_READ_SIZE = 64 * 1024
+
+def _parse_build_timestamp(info: Dict[str, Any]) -> Optional[datetime.datetime]:
+    """Parses a notification's ISO 'timestamp' (the build VM sends a trailing Z). Naive
+    timestamps are taken as UTC so all builds compare. None if missing or malformed."""
+    timestamp_str = info.get('timestamp')
+    if not timestamp_str:
+        return None
+    try:
+        timestamp = datetime.datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+    except (TypeError, ValueError, AttributeError):
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp
+
+def _notification_problem(notification: Any) -> Optional[str]:
+    """Checks a decoded notification's shape once, on arrival, so everything downstream
+    can rely on it. Returns what is wrong with it, or None if it can be recorded."""
+    if not isinstance(notification, dict):
+        return f"expected a JSON object, got {type(notification).__name__}"
+    if not isinstance(notification.get('status'), str):
+        return "missing or non-string 'status'"
+    for key in ('commit', 'session_id', 'timestamp'):
+        if notification.get(key) is not None and not isinstance(notification[key], str):
+            return f"non-string '{key}'"
+    if not notification.get('commit') and not notification.get('session_id'):
+        return "neither a 'commit' nor a 'session_id'"
+    return None
+
+def _open_listener_stderr_log():
+    """Opens LISTENER_STDERR_LOG for appending, first moving it to LISTENER_STDERR_LOG.1 if
+    it has outgrown LISTENER_STDERR_LOG_MAX_BYTES. O_CLOEXEC keeps the fd out of any other
+    child; Popen dups it onto the listener's stderr explicitly."""
+    try:
+        if os.path.getsize(LISTENER_STDERR_LOG) > LISTENER_STDERR_LOG_MAX_BYTES:
+            os.replace(LISTENER_STDERR_LOG, LISTENER_STDERR_LOG + ".1")
+    except FileNotFoundError:
+        pass
+    fd = os.open(LISTENER_STDERR_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_CLOEXEC, 0o644)
+    return os.fdopen(fd, "ab")
+
+class BuildStatus:
+    """
+    The latest completion notification for one commit. Slotted, since the service
+    keeps up to MAX_TRACKED_BUILDS of these and a per-entry dict costs several times the
+    memory. The timestamp is parsed once on arrival; to_dict() is the wire form.
+    """
+    __slots__ = ("commit", "status", "branch", "gcs_path", "timestamp", "build_id", "is_test_build", "parsed_timestamp")
+
+    def __init__(self, notification: Dict[str, Any], parsed_timestamp: Optional[datetime.datetime]):
+        self.commit = notification.get('commit')
+        self.status = notification['status']
+        self.branch = notification.get('branch')
+        self.gcs_path = notification.get('gcs_path')
+        self.timestamp = notification.get('timestamp') # As sent, for display
+        self.build_id = notification.get('build_id')
+        self.is_test_build = notification.get('is_test_build')
+        self.parsed_timestamp = parsed_timestamp # None if missing or malformed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "commit": self.commit,
+            "status": self.status,
+            "branch": self.branch,
+            "gcs_path": self.gcs_path,
+            "timestamp": self.timestamp,
+            "build_id": self.build_id,
+            "is_test_build": self.is_test_build,
+        }
+
+class BuildStatusService:
+    """
+    Receives build and asset bundle completion notifications and keeps the latest
+    status of each. There is one per process, shared by every orchestrator (see
+    get_build_status_service), so re-creating an agent never starts a second listener.
+    """
+
+    def __init__(self):
+        self.subscribers: List[Any] = [] # In-process pubsub_v1.SubscriberClients
+        self.streaming_pull_futures: List[Any] = [] # One future per active StreamingPull
+        self.subscriber_executors: List[concurrent.futures.ThreadPoolExecutor] = [] # Run StreamingPull callbacks
+        self.listener_process: Optional[subprocess.Popen] = None # subprocess.Popen object
+        self.stdout_reader_thread: Optional[threading.Thread] = None # Thread reading from subprocess stdout
+        self._stop_event = threading.Event() # Signal for graceful thread shutdown
+        # Self-pipe: shutdown() writes a byte so the stdout reader wakes from select() at once
+        self._wake_r: Optional[int] = None
+        self._wake_w: Optional[int] = None
+
+        # Use commit hash as the primary key for caching purposes; guarded by _statuses_lock
+        self.current_build_statuses: "collections.OrderedDict[str, BuildStatus]" = collections.OrderedDict()
+        # Use session id as the primary key; guarded by _statuses_lock
+        self.current_asset_bundle_statuses: "collections.OrderedDict[str, Dict[str, Any]]" = collections.OrderedDict()
+        self._statuses_lock = threading.Lock() # Listener threads write statuses while tools read them
+        self._latest_build = None # (timestamp, commit) of the newest build, kept current on write; guarded by _statuses_lock
+
+    def get_build_status(self, requestedCommit: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Retrieves the most recent build status. Ex: 'nobuild', 'success', 'failed'.
+        If the user specifies a commit, look for that build. If not, look for the
+        latest build they triggered.
+
+        Args:
+            requestedCommit: optional, to ask for a certain commit's status
+        Returns:
+            dict: A dictionary containing the status of the requested build(s).
+        """ 
+        requested = isinstance(requestedCommit, str) and requestedCommit.strip()
+        # Take what we need under the lock; listener threads may be writing
+        with self._statuses_lock:
+            if not self.current_build_statuses:
+                return {"message": "No build status information available."}
+            if requested:
+                status_info = self.current_build_statuses.get(requestedCommit)
+            else:
+                latest = self._latest_build
+                latest_info = self.current_build_statuses[latest[1]] if latest else None
+
+        # --- Retrieve status from the current_build_statuses dictionary ---
+        if requested:
+            if status_info:
+                return {
+                    "status": status_info.status,
+                }
+            return {"requestedCommit": requestedCommit, "status": "not_found", "message": f"Build for commit '{requestedCommit}' status not found or not yet processed."}
+        else: 
+            # Latest build by timestamp, maintained as notifications arrive
+            if latest is None:
+                return {"message": "No valid timestamp found for builds."}
+
+            return {
+                "commit": latest[1],
+                "status": latest_info.status,
+            }
+
+    def build_statuses_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Every tracked build as JSON-ready dicts keyed by commit, oldest-updated first.
+        """
+        with self._statuses_lock:
+            return {commit: info.to_dict() for commit, info in self.current_build_statuses.items()}
+
+    def asset_bundle_statuses_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Every tracked asset bundle notification keyed by session id, oldest-updated first.
+        """
+        with self._statuses_lock:
+            return dict(self.current_asset_bundle_statuses)
+
+    def start_build_completion_listener(self):
+        """
+        Starts receiving build completion notifications, in-process unless
+        LISTENER_MODE selects the listener.py subprocess.
+        """
+        if LISTENER_MODE == "subprocess":
+            if os.name == "posix":
+                self.start_external_listener_subprocess()
+                return
+            logger.error("LISTENER_MODE=subprocess is only supported on POSIX systems; "
+                         "using the in-process StreamingPull listener instead.")
+            self.start_streaming_pull_listener()
+        else:
+            self.start_streaming_pull_listener()
+
+    def start_streaming_pull_listener(self):
+        """
+        Subscribes to the build completion subscription in this process. The client
+        library's streaming pull threads call _on_pubsub_message for each message.
+        Opens SUBSCRIBER_CLIENTS independent clients with SUBSCRIBER_STREAMS streams each.
+        Every stream gets its own callback pool: a stream shuts its scheduler's executor
+        down when it closes, so a shared pool would die with the first stream to fail.
+        """
+        if not GOOGLE_CLOUD_PROJECT_ID:
+            logger.error("GOOGLE_CLOUD_PROJECT_ID is not set. Build completion listener not started.")
+            return
+        subscription_path = completion_subscription_path(GOOGLE_CLOUD_PROJECT_ID)
+        try:
+            from google.cloud import pubsub_v1
+            from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
+            flow_control = pubsub_v1.types.FlowControl(**SUBSCRIBER_FLOW_CONTROL)
+            for index in range(SUBSCRIBER_CLIENTS):
+                subscriber = pubsub_v1.SubscriberClient(client_options=PUBSUB_CLIENT_OPTIONS)
+                self.subscribers.append(subscriber)
+                if index == 0:
+                    ensure_completion_subscription(subscriber, subscription_path)
+                for stream in range(SUBSCRIBER_STREAMS):
+                    executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=max(2, SUBSCRIBER_MAX_WORKERS // SUBSCRIBER_STREAMS),
+                        thread_name_prefix=f"build-completion-{index}-{stream}",
+                    )
+                    self.subscriber_executors.append(executor)
+                    self.streaming_pull_futures.append(subscriber.subscribe(
+                        subscription_path,
+                        callback=self._on_pubsub_message,
+                        flow_control=flow_control,
+                        scheduler=ThreadScheduler(executor=executor),
+                    ))
+            logger.info("Listening for build completions on %s with %d client(s) x %d stream(s)",
+                        subscription_path, SUBSCRIBER_CLIENTS, SUBSCRIBER_STREAMS)
+        except Exception as e:
+            logger.error("An error occurred while starting the build completion subscriber: %s", e)
+            self._stop_streaming_pull()
+
+    def _stop_streaming_pull(self):
+        """
+        Cancels every StreamingPull and releases its client and callback pool.
+        """
+        for future in self.streaming_pull_futures:
+            future.cancel()
+        for future in self.streaming_pull_futures:
+            try:
+                future.result(timeout=5) # Wait for callbacks to drain
+            except Exception:
+                pass
+        for subscriber in self.subscribers:
+            subscriber.close()
+        for executor in self.subscriber_executors:
+            executor.shutdown(wait=False)
+        self.streaming_pull_futures.clear()
+        self.subscribers.clear()
+        self.subscriber_executors.clear()
+
+    def _on_pubsub_message(self, message):
+        """
+        StreamingPull callback, run on the subscriber's worker threads.
+        """
+        try:
+            self._handle_notification(notification_from_message(message))
+        except ValueError as e:
+            logger.warning("Failed to decode build completion message %s: %s", message.message_id, e)
+        except Exception:
+            logger.exception("Error handling build completion message %s", message.message_id)
+        finally:
+            # Always ack: a malformed message would otherwise be redelivered forever
+            message.ack()
+
+    def _handle_notification(self, notification: Dict[str, Any]):
+        """
+        Records a build or asset bundle completion notification, from either listener.
+        Malformed notifications are logged and dropped here, before they reach the tables.
+        """
+        problem = _notification_problem(notification)
+        if problem is not None:
+            logger.warning("Dropping malformed completion notification (%s): %r", problem, notification)
+            return
+        commit_hash = notification.get('commit')
+        session_id = notification.get('session_id')
+        if commit_hash:
+            timestamp = _parse_build_timestamp(notification)
+            if timestamp is None and notification.get('timestamp'):
+                logger.warning("Could not parse timestamp for commit %s: %r", commit_hash, notification.get('timestamp'))
+            # Update the orchestrator's internal build status dictionary with the latest status
+            status = BuildStatus(notification, timestamp)
+            with self._statuses_lock:
+                self.current_build_statuses[commit_hash] = status
+                self.current_build_statuses.move_to_end(commit_hash)
+                while len(self.current_build_statuses) > MAX_TRACKED_BUILDS:
+                    self.current_build_statuses.popitem(last=False)
+
+                latest = self._latest_build
+                if timestamp is not None and (latest is None or timestamp >= latest[0]):
+                    self._latest_build = (timestamp, commit_hash)
+                elif latest is not None and (latest[1] == commit_hash or latest[1] not in self.current_build_statuses):
+                    # The newest build was rewound or evicted; rescan for the new newest
+                    self._latest_build = self._scan_latest_build()
+            logger.debug("Processed update for commit: %s, Status: %s", commit_hash, status.status)
+        elif session_id:
+            # Update asset bundle status instead
+            with self._statuses_lock:
+                self.current_asset_bundle_statuses[session_id] = notification
+                self.current_asset_bundle_statuses.move_to_end(session_id)
+                while len(self.current_asset_bundle_statuses) > MAX_TRACKED_ASSET_BUNDLES:
+                    self.current_asset_bundle_statuses.popitem(last=False)
+            logger.debug("Processed update for asset bundle for session: %s, Status: %s", session_id, notification['status'])
+
+    def _scan_latest_build(self):
+        """
+        Finds the (timestamp, commit) of the newest tracked build. Caller holds _statuses_lock.
+        """
+        latest = None
+        for commit, info in self.current_build_statuses.items():
+            timestamp = info.parsed_timestamp
+            if timestamp is not None and (latest is None or timestamp > latest[0]):
+                latest = (timestamp, commit)
+        return latest
+
+    def start_external_listener_subprocess(self):
+        """
+        Launches listener.py as a separate, long-running process and starts
+        a thread to continuously read its stdout.
+        """
+        stderr_log = None
+        try:
+            # Send stderr to a file only when debugging; otherwise discard it
+            if LISTENER_DEBUG:
+                stderr_log = _open_listener_stderr_log()
+
+            self.listener_process = subprocess.Popen(
+                LISTENER_COMMAND,
+                stdout=subprocess.PIPE,
+                stderr=stderr_log or subprocess.DEVNULL,
+                close_fds=True,
+                # Own process group: a terminal Ctrl-C doesn't reach it, so shutdown() decides when it stops.
+                # If this process dies without shutdown() (SIGKILL), listener.py notices it was
+                # re-parented and exits on its own.
+                start_new_session=True,
+                env={key: os.environ[key] for key in LISTENER_ENV_VARS if key in os.environ},
+            ) # Binary pipe: lines are parsed as UTF-8 JSON bytes, skipping the text decode layer
+            logger.info("Launched listener.py process with PID: %s", self.listener_process.pid)
+
+            # Start a thread to read stdout from the listener process
+            self._wake_r, self._wake_w = os.pipe()
+            self.stdout_reader_thread = threading.Thread(target=self._read_listener_stdout, daemon=True)
+            self.stdout_reader_thread.start()
+            logger.debug("Started stdout reader thread for listener process.")
+
+        except FileNotFoundError:
+            logger.error("Python interpreter or listener.py not found at %s.", LISTENER_SCRIPT_PATH)
+        except Exception as e:
+            logger.error("An error occurred while launching listener.py: %s", e)
+        finally:
+            # The child has its own copy of the fd; ours is not needed past the launch
+            if stderr_log:
+                stderr_log.close()
+   
+    def _read_listener_stdout(self):
+        """
+        Continuously reads lines from the listener.py's stdout, parses them as JSON,
+        and records them via _handle_notification. This runs in a separate thread.
+        """
+
+        # example incoming message. for a build completion message
+        # $completionPayload = @{
+        #         session_id = "123..."
+        #         commit = $commitHash
+        #         branch = $branchName
+        #         status = "success"
+        #         is_test_build = $isTestBuild
+        #         gcs_path = $finalGcsPath
+        #         timestamp = (Get-Date -Format 'yyyy-MM-ddTHH:mm:ssZ')
+        #         build_id = $receivedBuildId
+        #     }
+
+        if not self.listener_process or not self.listener_process.stdout:
+            logger.error("Listener process or its stdout not initialized. Cannot read stdout.")
+            return
+
+        logger.debug("Stdout reader thread started, waiting for output from listener.py...")
+        # Read the raw fd directly: one os.read per burst instead of one readline per notification.
+        # The buffered stdout object is never read from, so nothing is stranded in its buffer.
+        fd = self.listener_process.stdout.fileno()
+        os.set_blocking(fd, False)
+        pending = b"" # Trailing partial line, completed by the next read
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            selector.register(self._wake_r, selectors.EVENT_READ)
+            while not self._stop_event.is_set():
+                try:
+                    # Blocks in the kernel until the listener writes or shutdown() wakes us; no idle polling
+                    ready = [key.fd for key, _ in selector.select()]
+                    if self._wake_r in ready:
+                        break
+                    chunk = os.read(fd, LISTENER_READ_SIZE)
+                except BlockingIOError:
+                    continue # Spurious wakeup
+                except Exception as e:
+                    logger.error("Error reading from listener stdout: %s", e)
+                    break # Exit the thread on error
+                if not chunk:
+                    # The fd was readable but empty: EOF, the listener exited
+                    logger.info("Listener process has exited. Stopping stdout reader thread.")
+                    break
+                *lines, pending = (pending + chunk).split(b"\n")
+                for line in lines:
+                    self._handle_listener_line(line)
+
+        logger.debug("Stdout reader thread stopping.")
+
+    def _handle_listener_line(self, line: bytes):
+        """
+        Parses one line of listener.py output and records the notification it carries.
+        """
+        line = line.strip()
+        if not line:
+            return
+        if logger.isEnabledFor(logging.DEBUG): # Skip the repr of every line otherwise
+            logger.debug("[Listener STDOUT]: %r", line)
+        try:
+            notification = json_loads(line) # Both parsers accept UTF-8 bytes; shape is checked in _handle_notification
+        except ValueError as e: # JSONDecodeError or invalid UTF-8
+            logger.warning("Failed to decode JSON from listener stdout: %r - Error: %s", line, e)
+            return
+        try:
+            self._handle_notification(notification)
+        except Exception:
+            logger.exception("Error handling listener notification")
+
+    def shutdown(self):
+        """
+        Gracefully shuts down the listener subprocess and reader thread.
+        """
+        logger.info("Shutting down the build status service...")
+        # Signal the stdout reader thread to stop, waking it if it is blocked in select()
+        self._stop_event.set()
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b"x")
+            except OSError:
+                pass
+
+        # Stop the in-process StreamingPulls and release their channels
+        if self.streaming_pull_futures:
+            logger.info("Cancelling build completion subscription...")
+        self._stop_streaming_pull()
+
+        # Terminate the listener's process group (it leads its own session), if it's running
+        if self.listener_process and self.listener_process.poll() is None:
+            logger.info("Terminating listener.py process...")
+            self._signal_listener_group(signal.SIGTERM)
+            try:
+                self.listener_process.wait(timeout=5) # Wait for process to terminate
+            except subprocess.TimeoutExpired:
+                logger.warning("Listener process did not terminate gracefully, killing it.")
+                self._signal_listener_group(signal.SIGKILL)
+                self.listener_process.wait()
+        
+        # Join the stdout reader thread to ensure it finishes
+        if self.stdout_reader_thread and self.stdout_reader_thread.is_alive():
+            logger.debug("Joining stdout reader thread...")
+            self.stdout_reader_thread.join(timeout=5)
+            if self.stdout_reader_thread.is_alive():
+                logger.warning("stdout reader thread did not terminate in time.")
+
+        # Close the wake pipe once nothing can be selecting on it
+        if self._wake_r is not None and not (self.stdout_reader_thread and self.stdout_reader_thread.is_alive()):
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = None
+
+        logger.info("Build status service shutdown complete.")
+
+    def _signal_listener_group(self, sig: int):
+        """
+        Sends sig to the listener and anything it spawned. The group id is the listener's pid.
+        """
+        try:
+            os.killpg(self.listener_process.pid, sig)
+        except ProcessLookupError:
+            pass # Already gone
+
+
+_service: Optional[BuildStatusService] = None
+_service_lock = threading.Lock()
+
+def get_build_status_service() -> BuildStatusService:
+    """Returns the process-wide BuildStatusService, starting its completion listener
+    and registering its shutdown on first use."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                service = BuildStatusService()
+                service.start_build_completion_listener()
+                atexit.register(service.shutdown)
+                _service = service
+    return _service
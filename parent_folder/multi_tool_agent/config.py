@@ -0,0 +1,68 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv() # Read .env once for the whole package
+
+logger = logging.getLogger(__name__)
+
+
+def _positive_int_env(name: str, default: int) -> int:
+    """Reads a count setting: values below 1 are raised to 1, and an empty or non-numeric
+    value falls back to default with a warning instead of failing the package import."""
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        logger.warning("%s=%r is not an integer; using %d", name, raw, default)
+        return default
+
+
+@dataclass(frozen=True)
+class Config:
+    """Environment settings for the agent modules, read once at import."""
+    google_cloud_project: Optional[str]
+    google_cloud_project_id: Optional[str]
+    unity_build_topic_id: Optional[str]
+    gcs_build_bucket_name: Optional[str]
+    github_token: Optional[str]
+    app_base_url: str
+    app_mode: str
+    unity_nobuild: bool # Development switch: build requests are logged but never published
+    listener_mode: str # "in_process" (streaming pull) or "subprocess" (listener.py)
+    listener_debug: bool # Keep the subprocess listener's stderr in listener_stderr.log
+    subscriber_clients: int # Independent StreamingPull clients for the in-process listener
+    subscriber_streams: int # StreamingPull streams opened on each of those clients
+    pubsub_api_endpoint: Optional[str] # e.g. "us-central1-pubsub.googleapis.com:443" to pin a region
+    log_level: Optional[str] # Package log level, e.g. "DEBUG"; unset follows the root logger (adk web --log_level)
+
+    @classmethod
+    def from_env(cls) -> "Config":
+        return cls(
+            google_cloud_project=os.getenv("GOOGLE_CLOUD_PROJECT"),
+            google_cloud_project_id=os.getenv("GOOGLE_CLOUD_PROJECT_ID"),
+            unity_build_topic_id=os.getenv("UNITY_BUILD_PUB_SUB_TOPIC_ID"),
+            gcs_build_bucket_name=os.getenv("GCS_BUILD_BUCKET_NAME"),
+            github_token=os.getenv("GITHUB_TOKEN"),
+            app_base_url=os.getenv("APP_BASE_URL", "http://localhost:8000"),
+            app_mode=os.getenv("APP_MODE", "web"), # default to web mode
+            unity_nobuild=os.getenv("UNITY_NOBUILD") == "1",
+            listener_mode=os.getenv("LISTENER_MODE", "in_process"),
+            listener_debug=os.getenv("LISTENER_DEBUG") == "1",
+            subscriber_clients=_positive_int_env("SUBSCRIBER_CLIENTS", 1),
+            subscriber_streams=_positive_int_env("UNITY_PUBSUB_STREAMS", 1),
+            pubsub_api_endpoint=os.getenv("PUBSUB_API_ENDPOINT"),
+            log_level=(os.getenv("LOG_LEVEL") or "").upper() or None,
+        )
+
+
+CONFIG = Config.from_env()
+
+# client_options for every Pub/Sub client: the regional endpoint next to the build VMs when
+# configured, the global endpoint otherwise. Publisher and subscribers must agree on it.
+PUBSUB_CLIENT_OPTIONS = {"api_endpoint": CONFIG.pubsub_api_endpoint} if CONFIG.pubsub_api_endpoint else None
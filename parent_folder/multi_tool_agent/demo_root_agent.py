@@ -103,4 +103,9 @@ async def main():
                 print(f"[PubSub Monitor] {event.content.parts[0].text}")
 
 if __name__ == "__main__":
+    try:
+        import uvloop # optional: faster event loop for the runner's network-bound awaits
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
@@ -2,16 +2,73 @@
 
 import asyncio
 import json
+import logging
 import base64
 import os
 import sys # Import sys to explicitly write to stdout and stderr
-from google.cloud import pubsub_v1
+import threading
+
+try:
+    import orjson # optional: C-backed JSON for notification bodies and stdout lines
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration Variables ---
 
 GOOGLE_CLOUD_PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT_ID") 
 UNITY_BUILD_COMPLETION_TOPIC_ID = "unity-build-completion-topic" 
-APP_NAME = "unity_build_orchestrator" # Used for consistent subscription naming, same as agent.py
+APP_NAME = "unity_build_orchestrator" # Used for consistent subscription naming; the in-process subscriber uses the same name
+PARENT_CHECK_INTERVAL_SECONDS = 2 # How often the listener checks that the agent process is still alive
+
+# pubsub_v1 (gRPC and protobuf) is imported where a client is created, so the agent process
+# can import the helpers below without loading it.
+
+# --- Helpers shared with the in-process subscriber in build_status_service.py ---
+def completion_subscription_path(project_id: str) -> str:
+    """The subscription name should be consistent for every listener of the completion topic."""
+    completion_subscription_name = f"unity-build-completion-subscription-{APP_NAME}"
+    return f"projects/{project_id}/subscriptions/{completion_subscription_name}"
+
+def ensure_completion_subscription(subscriber_client, subscription_path: str):
+    """Creates the completion subscription if it doesn't exist (helpful for local testing).
+    subscriber_client is a pubsub_v1.SubscriberClient. Progress is logged, never printed, so
+    stdout stays reserved for notifications; in the agent process it reaches the package logger."""
+    try:
+        subscriber_client.get_subscription(request={"subscription": subscription_path})
+        logger.info("Subscription '%s' already exists.", subscription_path)
+    except Exception:
+        logger.info("Subscription '%s' not found, creating it on topic '%s'...", subscription_path, UNITY_BUILD_COMPLETION_TOPIC_ID)
+        project_id = subscription_path.split("/")[1]
+        topic_path_for_sub = subscriber_client.topic_path(project_id, UNITY_BUILD_COMPLETION_TOPIC_ID)
+        subscriber_client.create_subscription(
+            request={"name": subscription_path, "topic": topic_path_for_sub}
+        )
+        logger.info("Subscription '%s' created.", subscription_path)
+
+def decode_notification(data: bytes) -> dict:
+    """Decodes a build completion message body. The build VM publishes Base64 encoded
+    JSON; a body that is already raw JSON is parsed as-is ('{' is not in the Base64
+    alphabet, so the two can't be confused).
+    Raises ValueError (including json.JSONDecodeError) on malformed data."""
+    # Both parsers take UTF-8 bytes directly, no intermediate str
+    if data.lstrip()[:1] == b"{":
+        return json_loads(data)
+    return json_loads(base64.b64decode(data))
+
+def notification_from_message(message) -> dict:
+    """Returns the completion notification carried by a Pub/Sub message.
+    Senders that put the fields in message attributes (all strings) skip the body
+    decode entirely; otherwise the Base64 JSON body is parsed."""
+    attributes = message.attributes
+    if attributes and "status" in attributes:
+        return dict(attributes)
+    return decode_notification(message.data)
 
 # --- Basic Pub/Sub Listener for Build Completions ---
 async def listen_for_build_completions_simple(subscription_path: str):
@@ -24,118 +81,119 @@ async def listen_for_build_completions_simple(subscription_path: str):
         sys.stderr.flush()
         return
 
+    from google.cloud import pubsub_v1
     subscriber = pubsub_v1.SubscriberClient()
 
     sys.stderr.write(f"--- Starting simple Pub/Sub listener on: {subscription_path} ---\n")
     sys.stderr.flush() # Ensure this is written immediately
 
+    # Set once stdout breaks; checked with the parent pid by _watch_parent
+    parent_gone = threading.Event()
+
     def callback(message: pubsub_v1.subscriber.message.Message):
         # All logging/debugging for message reception and processing goes to stderr
         sys.stderr.write(f"--- Pub/Sub Listener: Received message ID: {message.message_id} ---\n")
         sys.stderr.flush()
 
-        notification_payload = {}
-        message_data_utf8_string = "" # Initialize for broader scope
-        message_data_json_string = "" # Initialize for broader scope
+        if parent_gone.is_set():
+            message.nack()
+            return
 
         try:
-            # Step 1: Decode the raw message data bytes to a UTF-8 string.
-            # This string will contain the Base64 encoded JSON from the sender.
-            message_data_utf8_string = message.data.decode('utf-8')
-            sys.stderr.write(f"DEBUG: Listener received raw UTF-8 string (Base64 encoded): {message_data_utf8_string}\n")
+            notification_payload = notification_from_message(message)
+            sys.stderr.write("DEBUG: Listener successfully parsed JSON.\n")
             sys.stderr.flush()
 
-            # Step 2: Base64 decode the string to get the original JSON string.
-            message_data_json_string = base64.b64decode(message_data_utf8_string).decode('utf-8')
-            sys.stderr.write(f"DEBUG: Listener received Base64-decoded JSON string: {message_data_json_string}\n")
+            # If successfully parsed, send the JSON to stdout for the parent process.
+            # Binary stdout: one UTF-8 JSON line per notification, no text-layer encoding
+            sys.stdout.buffer.write(json_dumps(notification_payload) + b'\n')
+            sys.stdout.buffer.flush()
+            sys.stderr.write("--- Pub/Sub Listener Message: Dumped parsed JSON to stdout ---\n")
             sys.stderr.flush()
 
-            # Step 3: Attempt to parse the Base64-decoded string as JSON.
-            try:
-                notification_payload = json.loads(message_data_json_string)
-                sys.stderr.write(f"DEBUG: Listener successfully parsed JSON.\n")
-                sys.stderr.flush()
-
-                # If successfully parsed, send the JSON to stdout for the parent process.
-                try:
-                    sys.stdout.write(json.dumps(notification_payload) + '\n')
-                    sys.stdout.flush()
-                    sys.stderr.write(f"--- Pub/Sub Listener Message: Dumped parsed JSON to stdout ---\n")
-                    sys.stderr.flush()
-                except BrokenPipeError:
-                    sys.stderr.write("--- Pub/Sub Listener Error: Parent process pipe broken. Listener exiting gracefully.\n")
-                    sys.stderr.flush()
-
-            except json.JSONDecodeError as e:
-                # Handle cases where the Base64-decoded string isn't valid JSON.
-                sys.stderr.write(f"ERROR: Listener failed to parse JSON from Base64-decoded string. Error: {e}\n")
-                sys.stderr.write(f"ERROR: Malformed JSON string that caused error: {message_data_json_string}\n")
-                sys.stderr.write(f"ERROR: Original Base64 encoded string (before Base64 decode): {message_data_utf8_string}\n")
-                sys.stderr.flush()
-
-            except Exception as e:
-                # Catch any other unexpected errors during JSON parsing or stdout write.
-                sys.stderr.write(f"ERROR: An unexpected error occurred during message processing: {e}\n")
-                sys.stderr.write(f"DEBUG: String being processed at time of error: {message_data_json_string}\n")
-                sys.stderr.flush()
-
-        except Exception as e:
-            # Catch errors during initial decoding or Base64 decoding.
-            sys.stderr.write(f"ERROR: Failed to decode initial message data or perform Base64 decode: {e}\n")
+        except BrokenPipeError:
+            # The parent is gone, so nobody received this notification: leave it unacked for
+            # the next listener and stop pulling.
+            message.nack()
+            parent_gone.set()
+            # Point stdout at devnull so the interpreter's exit-time flush doesn't raise again
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.stderr.write("--- Pub/Sub Listener Error: Parent process pipe broken. Listener exiting. ---\n")
+            sys.stderr.flush()
+            return
+        except ValueError as e:
+            # Not Base64, not UTF-8, or the decoded string isn't valid JSON.
+            sys.stderr.write(f"ERROR: Listener failed to decode Base64 JSON message. Error: {e}\n")
+            sys.stderr.write(f"ERROR: Raw message data: {message.data!r}\n")
             sys.stderr.flush()
-        finally:
-            # ALWAYS acknowledge the message to prevent it from being redelivered.
-            message.ack()
-            sys.stderr.write(f"--- Pub/Sub Listener: Acknowledged message {message.message_id}. ---\n")
+        except Exception as e:
+            # Catch any other unexpected errors during processing or stdout write.
+            sys.stderr.write(f"ERROR: An unexpected error occurred during message processing: {e}\n")
             sys.stderr.flush()
 
+        # Acknowledge delivered and undecodable messages alike so they aren't redelivered.
+        message.ack()
+        sys.stderr.write(f"--- Pub/Sub Listener: Acknowledged message {message.message_id}. ---\n")
+        sys.stderr.flush()
+
     # Start the subscriber in a non-blocking way
     future = subscriber.subscribe(subscription_path, callback)
 
+    watcher = asyncio.ensure_future(_watch_parent(future, os.getppid(), parent_gone))
+
     try:
         # Keep the listener running indefinitely
         # This will block until the subscription is cancelled or an error occurs
         sys.stderr.write(f"--- Pub/Sub Listener: Listening for messages on {subscription_path}... ---\n")
         sys.stderr.flush()
-        await future.result()
+        # Await without parking the loop thread; the future completes when the stream ends
+        await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # Cancelled by _watch_parent: nobody is reading stdout any more
+        sys.stderr.write("--- Pub/Sub Listener: Parent process gone, stopping. ---\n")
+        sys.stderr.flush()
+        subscriber.close()
     except TimeoutError:
         sys.stderr.write("--- Pub/Sub Listener timed out. ---\n")
         sys.stderr.flush()
         future.cancel()
-        await subscriber.close()
+        subscriber.close()
     except Exception as e:
         sys.stderr.write(f"--- Pub/Sub Listener experienced an error: {e} ---\n")
         sys.stderr.flush()
         future.cancel()
-        await subscriber.close()
+        subscriber.close()
+    finally:
+        watcher.cancel()
+
+async def _watch_parent(future, parent_pid: int, parent_gone: threading.Event):
+    """Cancels the streaming pull once the parent is gone: stdout broke, or the parent died
+    (even by SIGKILL) and this process was re-parented. The listener runs in its own session,
+    so without this it would outlive the agent and keep acking messages nobody reads."""
+    while not future.done():
+        if parent_gone.is_set() or os.getppid() != parent_pid:
+            parent_gone.set()
+            future.cancel()
+            return
+        await asyncio.sleep(PARENT_CHECK_INTERVAL_SECONDS)
 
 # --- Main entry point for the listener script ---
 async def main_listener():
     # Define the subscription path for the completion topic
-    # The subscription name should be consistent for this listener.
-    completion_subscription_name = f"unity-build-completion-subscription-{APP_NAME}"
-    completion_subscription_path = f"projects/{GOOGLE_CLOUD_PROJECT_ID}/subscriptions/{completion_subscription_name}"
+    subscription_path = completion_subscription_path(GOOGLE_CLOUD_PROJECT_ID)
 
     # --- Create a subscription if it doesn't exist (helpful for local testing) ---
+    from google.cloud import pubsub_v1
     subscriber_client = pubsub_v1.SubscriberClient()
     try:
-        subscriber_client.get_subscription(request={"subscription": completion_subscription_path})
-        sys.stderr.write(f"Subscription '{completion_subscription_path}' already exists.\n") # <-- CHANGED TO sys.stderr
-        sys.stderr.flush()
-    except Exception as e:
-        sys.stderr.write(f"Subscription '{completion_subscription_path}' not found, creating it on topic '{UNITY_BUILD_COMPLETION_TOPIC_ID}'...\n") # <-- CHANGED TO sys.stderr
-        sys.stderr.flush()
-        topic_path_for_sub = subscriber_client.topic_path(GOOGLE_CLOUD_PROJECT_ID, UNITY_BUILD_COMPLETION_TOPIC_ID)
-        subscriber_client.create_subscription(
-            request={"name": completion_subscription_path, "topic": topic_path_for_sub}
-        )
-        sys.stderr.write(f"Subscription '{completion_subscription_path}' created.\n") # <-- CHANGED TO sys.stderr
-        sys.stderr.flush()
+        ensure_completion_subscription(subscriber_client, subscription_path)
     finally:
         subscriber_client.close()
 
     # Start the simple listener
-    await listen_for_build_completions_simple(completion_subscription_path)
+    await listen_for_build_completions_simple(subscription_path)
 
 if __name__ == "__main__":
+    # Run as a script, log records join the rest of the diagnostics on stderr
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(message)s")
     asyncio.run(main_listener())
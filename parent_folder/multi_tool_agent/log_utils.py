@@ -0,0 +1,37 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Optional, Union
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def setup_queue_logging(package_name: str, level: Optional[Union[int, str]] = None) -> logging.Logger:
+    """Routes the package's log records through a queue to a background writer thread.
+
+    Tool code runs on the ADK event loop; a logging call only enqueues the record,
+    and the QueueListener thread does the blocking write to stdout. Safe to call
+    more than once: the handler is installed a single time. With no level the
+    package inherits the root logger's, so `adk web --log_level` applies.
+    """
+    package_logger = logging.getLogger(package_name)
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in package_logger.handlers):
+        return package_logger
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop) # Drain queued records on shutdown
+
+    package_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    if level is not None:
+        try:
+            package_logger.setLevel(level)
+        except ValueError: # Unknown level name, e.g. a typo in LOG_LEVEL
+            package_logger.warning("Ignoring unknown log level %r", level)
+    package_logger.propagate = False # Already written by our own handler
+    return package_logger
@@ -281,12 +281,12 @@ def get_fast_api_app(
   @app.get("/api/asset-bundle-statuses")
   async def get_asset_bundle_statuses():
     runner = await _get_runner_async("multi_tool_agent")
-    return JSONResponse(content=runner.agent.current_asset_bundle_statuses.copy())
+    return JSONResponse(content=runner.agent.asset_bundle_statuses_snapshot())
 
   @app.get("/api/build-statuses")
   async def get_build_statuses():
     runner = await _get_runner_async("multi_tool_agent")
-    return JSONResponse(content=runner.agent.current_build_statuses.copy())
+    return JSONResponse(content=runner.agent.build_statuses_snapshot())
 
   @app.get("/api/upload", response_class=HTMLResponse)
   async def upload_asset_page(request: Request):
@@ -0,0 +1,115 @@
+import ast
+import glob
+import inspect
+import os
+
+import pytest
+
+from multi_tool_agent.asset_preview_agent import ASSET_AGENT_TOOL_FUNCTIONS
+from multi_tool_agent.build_orchestration_agent import BUILD_AGENT_TOOL_FUNCTIONS
+from multi_tool_agent.version_control_agent import VERSION_CONTROL_TOOL_FUNCTIONS
+
+AGENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+# Every module in the package, so a new async tool is checked without editing this list
+AGENT_MODULES = sorted(glob.glob(os.path.join(AGENT_DIR, "*.py")))
+
+# Calls that block the calling thread, and with it the whole event loop
+BLOCKING_CALLS = {
+    "subprocess.run",
+    "subprocess.call",
+    "subprocess.check_call",
+    "subprocess.check_output",
+    "time.sleep",
+    "os.system",
+}
+
+# Sync tools ADK may call directly on the event loop: they only queue work or read memory
+NON_BLOCKING_SYNC_TOOLS = {
+    "publish_build_request", # publisher.publish() queues; the ack arrives on a done-callback
+    "publish_build_requests",
+    "publish_asset_build_request",
+}
+
+
+def _dotted_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        parent = _dotted_name(node.value)
+        return f"{parent}.{node.attr}" if parent else node.attr
+    return None
+
+
+def _walk_own_body(func_node):
+    """Yields the nodes of a function body, skipping nested defs and lambdas (e.g. done-callbacks)."""
+    stack = list(func_node.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            continue
+        yield node
+        stack.extend(ast.iter_child_nodes(node))
+
+
+def _async_defs(source):
+    return [node for node in ast.walk(ast.parse(source)) if isinstance(node, ast.AsyncFunctionDef)]
+
+
+def _blocking_calls_in_async_defs(source):
+    offenders = []
+    for node in _async_defs(source):
+        for child in _walk_own_body(node):
+            if not isinstance(child, ast.Call):
+                continue
+            name = _dotted_name(child.func) or ""
+            # future.result() parks the thread until the RPC completes
+            if name in BLOCKING_CALLS or name.endswith(".result"):
+                offenders.append(f"{node.name}:{child.lineno} calls {name}()")
+    return offenders
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_scan_covers_async_code():
+    # Guards against the scan silently checking nothing (e.g. run_in_thread's wrapper moving)
+    assert any(_async_defs(_read(path)) for path in AGENT_MODULES)
+
+
+@pytest.mark.parametrize("path", AGENT_MODULES, ids=os.path.basename)
+def test_async_defs_do_not_block_event_loop(path):
+    offenders = _blocking_calls_in_async_defs(_read(path))
+    assert not offenders, f"Blocking calls inside async defs in {os.path.basename(path)}: {offenders}"
+
+
+@pytest.mark.parametrize("tool", [
+    *VERSION_CONTROL_TOOL_FUNCTIONS,
+    *BUILD_AGENT_TOOL_FUNCTIONS,
+    *[tool for tool in ASSET_AGENT_TOOL_FUNCTIONS if inspect.isroutine(tool)], # FunctionTool instances are ADK's own
+], ids=lambda tool: tool.__name__)
+def test_blocking_tools_run_off_the_event_loop(tool):
+    # GitHub and GCS calls block; run_in_thread turns them into coroutine functions ADK awaits
+    if tool.__name__ in NON_BLOCKING_SYNC_TOOLS:
+        return
+    assert inspect.iscoroutinefunction(tool), f"{tool.__name__} is sync; wrap it with run_in_thread"
+
+
+def test_detects_blocking_call_in_async_def():
+    source = (
+        "async def tool():\n"
+        "    future = publisher.publish(topic, data=b'')\n"
+        "    return future.result()\n"
+    )
+    assert _blocking_calls_in_async_defs(source) == ["tool:3 calls future.result()"]
+
+
+def test_ignores_blocking_call_in_nested_callback():
+    source = (
+        "async def tool():\n"
+        "    def _on_done(f):\n"
+        "        print(f.result())\n"
+        "    future.add_done_callback(_on_done)\n"
+    )
+    assert _blocking_calls_in_async_defs(source) == []
@@ -0,0 +1,125 @@
+import pytest
+
+from multi_tool_agent import build_status_service
+from multi_tool_agent.build_status_service import BuildStatusService, _notification_problem
+
+
+def build(commit, timestamp=None, status="success", **extra):
+    notification = {"commit": commit, "status": status, "branch": "main", **extra}
+    if timestamp is not None:
+        notification["timestamp"] = timestamp
+    return notification
+
+
+@pytest.fixture
+def service():
+    # Not started: notifications are fed straight to _handle_notification
+    return BuildStatusService()
+
+
+def latest_commit(service):
+    return service.get_build_status().get("commit")
+
+
+# --- _latest_build maintenance ---
+
+def test_no_builds_yet(service):
+    assert service.get_build_status() == {"message": "No build status information available."}
+
+
+def test_latest_is_newest_timestamp_not_newest_arrival(service):
+    service._handle_notification(build("b", "2025-06-02T10:00:00Z"))
+    service._handle_notification(build("a", "2025-06-01T10:00:00Z"))
+    assert service.get_build_status() == {"commit": "b", "status": "success"}
+
+
+def test_update_to_newest_build_keeps_it_latest(service):
+    service._handle_notification(build("a", "2025-06-01T10:00:00Z"))
+    service._handle_notification(build("b", "2025-06-02T10:00:00Z", status="running"))
+    service._handle_notification(build("b", "2025-06-02T11:00:00Z", status="failed"))
+    assert service.get_build_status() == {"commit": "b", "status": "failed"}
+
+
+def test_rewound_latest_build_rescans(service):
+    service._handle_notification(build("a", "2025-06-02T10:00:00Z"))
+    service._handle_notification(build("b", "2025-06-03T10:00:00Z"))
+    # b is re-reported with an older timestamp, so a is now the newest
+    service._handle_notification(build("b", "2025-06-01T10:00:00Z"))
+    assert latest_commit(service) == "a"
+
+
+def test_evicted_latest_build_rescans(service, monkeypatch):
+    monkeypatch.setattr(build_status_service, "MAX_TRACKED_BUILDS", 2)
+    service._handle_notification(build("newest", "2025-06-03T10:00:00Z"))
+    service._handle_notification(build("old", "2025-06-01T10:00:00Z"))
+    service._handle_notification(build("middle", "2025-06-02T10:00:00Z")) # evicts "newest"
+    assert list(service.current_build_statuses) == ["old", "middle"]
+    assert latest_commit(service) == "middle"
+
+
+def test_builds_without_timestamps_are_tracked_but_never_latest(service):
+    service._handle_notification(build("untimed"))
+    service._handle_notification(build("garbled", "not-a-date"))
+    assert service.get_build_status() == {"message": "No valid timestamp found for builds."}
+    assert service.get_build_status("untimed") == {"status": "success"}
+
+    service._handle_notification(build("timed", "2025-06-01T10:00:00Z"))
+    assert latest_commit(service) == "timed"
+
+
+def test_untimestamped_update_of_latest_build_rescans(service):
+    service._handle_notification(build("a", "2025-06-01T10:00:00Z"))
+    service._handle_notification(build("b", "2025-06-02T10:00:00Z"))
+    service._handle_notification(build("b"))
+    assert latest_commit(service) == "a"
+
+
+def test_naive_and_zulu_timestamps_compare(service):
+    service._handle_notification(build("zulu", "2025-06-01T10:00:00Z"))
+    service._handle_notification(build("naive", "2025-06-01T11:00:00"))
+    assert latest_commit(service) == "naive"
+
+
+def test_unknown_commit_is_not_found(service):
+    service._handle_notification(build("a", "2025-06-01T10:00:00Z"))
+    assert service.get_build_status("zzz")["status"] == "not_found"
+
+
+def test_snapshots_are_plain_dicts(service):
+    service._handle_notification(build("a", "2025-06-01T10:00:00Z", gcs_path="gs://b/a.zip"))
+    service._handle_notification({"session_id": "s1", "status": "success"})
+    assert service.build_statuses_snapshot()["a"]["gcs_path"] == "gs://b/a.zip"
+    assert service.asset_bundle_statuses_snapshot() == {"s1": {"session_id": "s1", "status": "success"}}
+
+
+# --- Notification validation ---
+
+@pytest.mark.parametrize("notification", [
+    {"commit": "abc", "status": "success"},
+    {"commit": "abc", "status": "failed", "timestamp": "2025-06-01T10:00:00Z"},
+    {"session_id": "s1", "status": "success"},
+])
+def test_well_formed_notifications_pass(notification):
+    assert _notification_problem(notification) is None
+
+
+@pytest.mark.parametrize("notification", [
+    ["not", "an", "object"],
+    "success",
+    {"commit": "abc"},
+    {"commit": "abc", "status": 1},
+    {"status": "success"},
+    {"commit": "", "session_id": "", "status": "success"},
+    {"commit": 123, "status": "success"},
+    {"session_id": ["s1"], "status": "success"},
+    {"commit": "abc", "status": "success", "timestamp": 1717236000},
+])
+def test_malformed_notifications_are_reported(notification):
+    assert _notification_problem(notification)
+
+
+def test_malformed_notifications_are_dropped(service):
+    service._handle_notification({"commit": "abc"})
+    service._handle_notification({"commit": 123, "status": "success"})
+    assert not service.current_build_statuses
+    assert not service.current_asset_bundle_statuses
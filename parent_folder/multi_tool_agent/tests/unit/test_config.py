@@ -0,0 +1,24 @@
+import logging
+
+import pytest
+
+from multi_tool_agent.config import _positive_int_env
+
+
+def test_unset_uses_default(monkeypatch):
+    monkeypatch.delenv("SUBSCRIBER_CLIENTS", raising=False)
+    assert _positive_int_env("SUBSCRIBER_CLIENTS", 1) == 1
+
+
+@pytest.mark.parametrize("raw, expected", [("4", 4), (" 2 ", 2), ("0", 1), ("-3", 1)])
+def test_counts_are_clamped_to_at_least_one(monkeypatch, raw, expected):
+    monkeypatch.setenv("SUBSCRIBER_CLIENTS", raw)
+    assert _positive_int_env("SUBSCRIBER_CLIENTS", 1) == expected
+
+
+@pytest.mark.parametrize("raw", ["", "two", "1.5"])
+def test_bad_values_warn_and_use_default(monkeypatch, caplog, raw):
+    monkeypatch.setenv("UNITY_PUBSUB_STREAMS", raw)
+    with caplog.at_level(logging.WARNING, logger="multi_tool_agent.config"):
+        assert _positive_int_env("UNITY_PUBSUB_STREAMS", 1) == 1
+    assert "UNITY_PUBSUB_STREAMS" in caplog.text
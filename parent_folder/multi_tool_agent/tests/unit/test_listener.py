@@ -0,0 +1,67 @@
+import base64
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from multi_tool_agent.listener import decode_notification, ensure_completion_subscription, notification_from_message
+
+NOTIFICATION = {"commit": "abc123", "status": "success", "timestamp": "2025-06-01T10:00:00Z"}
+RAW_JSON = json.dumps(NOTIFICATION).encode("utf-8")
+
+
+def test_decodes_base64_json_from_the_build_vm():
+    assert decode_notification(base64.b64encode(RAW_JSON)) == NOTIFICATION
+
+
+def test_decodes_raw_json_as_is():
+    assert decode_notification(RAW_JSON) == NOTIFICATION
+
+
+def test_raw_json_may_have_leading_whitespace():
+    assert decode_notification(b"  \n" + RAW_JSON) == NOTIFICATION
+
+
+@pytest.mark.parametrize("data", [
+    b"not base64 at all!",
+    base64.b64encode(b"not json"),
+    b"{not json",
+    base64.b64encode(b"\xff\xfe"),
+])
+def test_malformed_bodies_raise_value_error(data):
+    with pytest.raises(ValueError):
+        decode_notification(data)
+
+
+def test_attributes_with_status_skip_the_body():
+    message = SimpleNamespace(attributes={"commit": "abc123", "status": "failed"}, data=b"ignored")
+    assert notification_from_message(message) == {"commit": "abc123", "status": "failed"}
+
+
+def test_body_is_decoded_without_status_attribute():
+    message = SimpleNamespace(attributes={"origin": "build-vm"}, data=base64.b64encode(RAW_JSON))
+    assert notification_from_message(message) == NOTIFICATION
+
+
+class MissingSubscriptionClient:
+    def __init__(self):
+        self.created = []
+
+    def get_subscription(self, request):
+        raise LookupError(request["subscription"])
+
+    def topic_path(self, project_id, topic_id):
+        return f"projects/{project_id}/topics/{topic_id}"
+
+    def create_subscription(self, request):
+        self.created.append(request)
+
+
+def test_subscription_setup_logs_instead_of_writing_stderr(caplog, capsys):
+    client = MissingSubscriptionClient()
+    with caplog.at_level(logging.INFO, logger="multi_tool_agent.listener"):
+        ensure_completion_subscription(client, "projects/p/subscriptions/s")
+    assert client.created == [{"name": "projects/p/subscriptions/s", "topic": "projects/p/topics/unity-build-completion-topic"}]
+    assert any("created" in record.getMessage() for record in caplog.records)
+    assert capsys.readouterr().err == ""
@@ -0,0 +1,55 @@
+import pytest
+
+from multi_tool_agent.agent import BUILD_REQUEST_PATTERN, OUT_OF_SCOPE_PATTERN
+
+# Fresh build requests naming both a commit SHA and a branch: transferred to the
+# BuildOrchestrationAgent without an LLM call
+BUILD_REQUESTS = [
+    "build 1fe522b on main",
+    "Build commit 1fe522b566d272fb22a71a30ade5f3bd8199d057 on branch dev",
+    "please rebuild 1fe522b566d2 on feature/ui",
+    "Can you build commit 1FE522B on main as a test build?",
+]
+
+# Everything else goes to the model: builds the VersionControlAgent must resolve first,
+# questions about a build, and requests that aren't game builds
+NOT_BUILD_REQUESTS = [
+    "build it",
+    "Build the game?",
+    "build main",
+    "build the latest on feature ui",
+    "please rebuild the latest on dev",
+    "build 1fe522b",
+    "build the defaced commit on main",
+    "build 1fe522b on the latest branch",
+    "Build status?",
+    "build status of 1fe522b on main",
+    "build 1fe522b on main\nstatus?",
+    "Build queue status?",
+    "build failed?",
+    "build done yet?",
+    "Compile a list of recent commits on main",
+    "build my asset bundle",
+    "is the build done?",
+    "what branches are there?",
+]
+
+
+@pytest.mark.parametrize("text", BUILD_REQUESTS)
+def test_build_requests_take_the_fast_path(text):
+    assert BUILD_REQUEST_PATTERN.match(text)
+
+
+@pytest.mark.parametrize("text", NOT_BUILD_REQUESTS)
+def test_build_questions_go_to_the_model(text):
+    assert not BUILD_REQUEST_PATTERN.match(text)
+
+
+@pytest.mark.parametrize("text", ["tell me a joke", "Please write me a poem", "what's the weather"])
+def test_small_talk_is_declined(text):
+    assert OUT_OF_SCOPE_PATTERN.match(text)
+
+
+@pytest.mark.parametrize("text", BUILD_REQUESTS + NOT_BUILD_REQUESTS)
+def test_unity_requests_are_not_declined(text):
+    assert not OUT_OF_SCOPE_PATTERN.match(text)
@@ -0,0 +1,37 @@
+import asyncio
+import inspect
+import threading
+
+from multi_tool_agent.tool_utils import encode_json, run_in_thread
+
+
+def lookup(branch: str, commit: str, expiration_minutes: int = 60) -> dict:
+    """Returns which thread ran the lookup."""
+    return {"branch": branch, "commit": commit, "thread": threading.get_ident()}
+
+
+def test_run_in_thread_keeps_what_adk_builds_the_schema_from():
+    wrapped = run_in_thread(lookup)
+    assert wrapped.__name__ == "lookup"
+    assert wrapped.__doc__ == lookup.__doc__
+    assert inspect.signature(wrapped) == inspect.signature(lookup)
+
+
+def test_run_in_thread_returns_a_coroutine_function():
+    # ADK awaits coroutine functions instead of calling them on the event loop
+    assert inspect.iscoroutinefunction(run_in_thread(lookup))
+
+
+def test_run_in_thread_runs_off_the_event_loop_thread():
+    async def call():
+        loop_thread = threading.get_ident()
+        result = await run_in_thread(lookup)("main", commit="abc123")
+        return loop_thread, result
+
+    loop_thread, result = asyncio.run(call())
+    assert result["branch"] == "main" and result["commit"] == "abc123"
+    assert result["thread"] != loop_thread
+
+
+def test_encode_json_is_compact_utf8():
+    assert encode_json({"a": 1, "b": "é"}) == '{"a":1,"b":"é"}'.encode("utf-8")
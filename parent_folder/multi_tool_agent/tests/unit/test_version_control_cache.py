@@ -0,0 +1,42 @@
+import pytest
+
+from multi_tool_agent import version_control_agent
+from multi_tool_agent.version_control_agent import _cached
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(version_control_agent, "_CACHE", {})
+    monkeypatch.setattr(version_control_agent, "_CACHE_LOCKS", {})
+
+
+def test_repeat_lookup_is_served_from_cache():
+    calls = []
+    lookup = lambda: calls.append(1) or "sha"
+    assert _cached("latest_commit:main", 60, lookup) == "sha"
+    assert _cached("latest_commit:main", 60, lookup) == "sha"
+    assert len(calls) == 1
+
+
+def test_expired_entry_is_looked_up_again():
+    calls = []
+    lookup = lambda: calls.append(1) or "sha"
+    _cached("latest_commit:main", 0, lookup)
+    _cached("latest_commit:main", 0, lookup)
+    assert len(calls) == 2
+
+
+def test_cache_and_locks_stay_bounded(monkeypatch):
+    monkeypatch.setattr(version_control_agent, "MAX_CACHE_ENTRIES", 3)
+    for i in range(10):
+        _cached(f"latest_commit:branch-{i}", 60, lambda: i)
+    assert list(version_control_agent._CACHE) == ["latest_commit:branch-7", "latest_commit:branch-8", "latest_commit:branch-9"]
+    assert len(version_control_agent._CACHE_LOCKS) <= 3
+
+
+def test_expired_entries_are_pruned_first(monkeypatch):
+    monkeypatch.setattr(version_control_agent, "MAX_CACHE_ENTRIES", 2)
+    _cached("branches", 60, lambda: ["main"])
+    _cached("latest_commit:a", 0, lambda: "a")
+    _cached("latest_commit:b", 0, lambda: "b")
+    assert list(version_control_agent._CACHE) == ["branches"]
@@ -0,0 +1,28 @@
+import asyncio
+import functools
+import json
+
+try:
+    import orjson # optional: C-backed encoder for Pub/Sub payloads
+except ImportError:
+    orjson = None
+
+
+def run_in_thread(func):
+    """Wraps a blocking tool function so ADK awaits it on a worker thread.
+
+    ADK calls sync tools directly on its event loop, so a slow GitHub or GCS
+    request stalls every other session until it returns. functools.wraps keeps
+    the name, signature and docstring ADK builds the tool schema from.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return wrapper
+
+
+def encode_json(obj) -> bytes:
+    """Compact UTF-8 JSON bytes for a message payload, via orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
@@ -1,13 +1,19 @@
 # version_control_agent.py
-import os
-from typing import Optional
+import functools
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
 
 from github import Github, Auth
-from dotenv import load_dotenv
+from .config import CONFIG
+from .tool_utils import run_in_thread
+
+logger = logging.getLogger(__name__)
 
-load_dotenv()
 # --- Configuration for your specific repo ---
-GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN") # Securely load from environment variable
+GITHUB_TOKEN = CONFIG.github_token # Securely load from environment variable
 REPO_OWNER = "cbpalumbi" 
 REPO_NAME = "Google_ADK_Example_Game" 
 
@@ -21,13 +27,13 @@ if GITHUB_TOKEN:
         # For a user repo: g.get_user().get_repo(REPO_NAME) or g.get_repo(f"{REPO_OWNER}/{REPO_NAME}")
         # The f-string is usually safer for general user/org repos
         TARGET_REPO = g.get_repo(f"{REPO_OWNER}/{REPO_NAME}")
-        print(f"[VC Tool] Connected to GitHub repo: {TARGET_REPO.full_name}")
+        logger.info("[VC Tool] Connected to GitHub repo: %s", TARGET_REPO.full_name)
     except Exception as e:
         TARGET_REPO = None
-        print(f"Error connecting to GitHub repo {REPO_OWNER}/{REPO_NAME}: {e}")
+        logger.warning("Error connecting to GitHub repo %s/%s: %s", REPO_OWNER, REPO_NAME, e)
 else:
     TARGET_REPO = None
-    print("GITHUB_TOKEN environment variable not set. Version Control tools will not function.")
+    logger.warning("GITHUB_TOKEN environment variable not set. Version Control tools will not function.")
 
 
 # Mock data for demonstration purposes
@@ -66,6 +72,99 @@ MOCK_GIT_REPOS = {
         }
     }
 }
+# --- Short-lived cache for repeated GitHub lookups ---
+# The LLM often re-calls the same tool several times within one conversation.
+# Serve those repeats from memory instead of another GitHub API round trip.
+# A branch head moves with every push; keep the window short so a build request resolves a
+# commit at most a few seconds stale.
+LATEST_COMMIT_TTL_SECONDS = 5
+BRANCH_LIST_TTL_SECONDS = 30
+# Keys include branch names from user messages, so bound the cache instead of growing per branch asked about
+MAX_CACHE_ENTRIES = 256
+
+_CACHE: Dict[str, Tuple[float, Any]] = {} # key -> (monotonic expiry time, value)
+_CACHE_LOCKS: Dict[str, threading.Lock] = {}
+_CACHE_LOCKS_GUARD = threading.Lock() # Also guards writes to _CACHE
+
+def _prune_cache(now: float):
+    """Drops expired entries, then the oldest ones while still over MAX_CACHE_ENTRIES, and the
+    locks of keys no longer cached. Call with _CACHE_LOCKS_GUARD held."""
+    for key in [key for key, (expires_at, _) in _CACHE.items() if expires_at <= now]:
+        del _CACHE[key]
+    while len(_CACHE) > MAX_CACHE_ENTRIES:
+        del _CACHE[next(iter(_CACHE))]
+    for key in [key for key, lock in _CACHE_LOCKS.items() if key not in _CACHE and not lock.locked()]:
+        del _CACHE_LOCKS[key]
+
+def _cached(key: str, ttl: float, fn: Callable[[], Any]) -> Any:
+    """Returns fn(), reusing the value cached under key if it is younger than ttl seconds.
+    Concurrent callers for the same key share one lookup. Exceptions are not cached."""
+    entry = _CACHE.get(key)
+    if entry and time.monotonic() < entry[0]:
+        return entry[1]
+
+    with _CACHE_LOCKS_GUARD:
+        lock = _CACHE_LOCKS.setdefault(key, threading.Lock())
+    with lock:
+        # Another caller may have refreshed the entry while we waited
+        entry = _CACHE.get(key)
+        if entry and time.monotonic() < entry[0]:
+            return entry[1]
+        value = fn()
+        now = time.monotonic()
+        with _CACHE_LOCKS_GUARD:
+            _CACHE.pop(key, None) # Re-insert at the end: insertion order is age order
+            _CACHE[key] = (now + ttl, value)
+            if len(_CACHE) > MAX_CACHE_ENTRIES or len(_CACHE_LOCKS) > MAX_CACHE_ENTRIES:
+                _prune_cache(now)
+        return value
+
+_FULL_SHA_RE = re.compile(r"[0-9a-f]{40}")
+
+def _fetch_commit_details(commit_id: str) -> dict:
+    # PyGithub's get_commit can often resolve partial hashes if unique
+    commit = TARGET_REPO.get_commit(commit_id)
+    return {
+        "hash": commit.sha,
+        "author": commit.author.login if commit.author else "Unknown",
+        "message": commit.commit.message,
+        "timestamp": commit.commit.author.date.isoformat() + "Z" # ISO 8601 format
+    }
+
+@functools.lru_cache(maxsize=64)
+def _fetch_commit_details_by_sha(sha: str) -> dict:
+    """A full SHA names an immutable commit, so its details are cached for the process lifetime."""
+    return _fetch_commit_details(sha)
+
+def _branch_names() -> list:
+    """Sorted branch names, TTL-cached. Treat the returned list as read-only."""
+    return _cached(
+        "branches",
+        BRANCH_LIST_TTL_SECONDS,
+        lambda: sorted(b.name for b in TARGET_REPO.get_branches()),
+    )
+
+def _branch_head_sha(branch: str) -> str:
+    return _cached(
+        f"latest_commit:{branch}",
+        LATEST_COMMIT_TTL_SECONDS,
+        lambda: TARGET_REPO.get_branch(branch).commit.sha,
+    )
+
+@functools.lru_cache(maxsize=32)
+def _recent_commits_from(head_sha: str, num_commits: int) -> tuple:
+    """History below a given head SHA never changes, so listings are cached per (head, count)."""
+    commits = TARGET_REPO.get_commits(sha=head_sha)[:num_commits]
+    return tuple(
+        {
+            "hash": commit.sha,
+            "author": commit.author.login if commit.author else "Unknown",
+            "message": commit.commit.message,
+            "timestamp": commit.commit.author.date.isoformat() + "Z"
+        }
+        for commit in commits
+    )
+
 # --- Tool Functions (defined as regular Python functions) ---
 def _check_repo_connection():
     """Helper to ensure the repo is connected before making API calls."""
@@ -85,12 +184,10 @@ def get_latest_commit_on_branch(branch: str) -> str:
     error = _check_repo_connection()
     if error: return error.get("error")
 
-    print(f"[VC Tool] Getting latest commit for branch: {branch} in repo: {TARGET_REPO.full_name}")
+    logger.debug("[VC Tool] Getting latest commit for branch: %s in repo: %s", branch, TARGET_REPO.full_name)
     try:
-        # Get the branch object
-        git_branch = TARGET_REPO.get_branch(branch)
-        # Get the latest commit from that branch
-        return git_branch.commit.sha
+        # Get the latest commit from the branch object
+        return _branch_head_sha(branch)
     except Exception as e:
         return f"Error: Branch '{branch}' not found or API error: {e}"
 
@@ -106,13 +203,13 @@ def resolve_branch_name(user_query: str) -> str:
     error = _check_repo_connection()
     if error: return error.get("error")
 
-    print(f"[VC Tool] Resolving branch name for query: '{user_query}' in repo: {TARGET_REPO.full_name}")
+    logger.debug("[VC Tool] Resolving branch name for query: '%s' in repo: %s", user_query, TARGET_REPO.full_name)
     query_lower = user_query.lower()
 
     try:
-        # Get all branches and try to find a match
-        branches = TARGET_REPO.get_branches()
-        branch_names = [b.name for b in branches]
+        # Only names are needed to match against, so reuse the cached branch list
+        # instead of paging through the branches API on every query
+        branch_names = _branch_names()
 
         # Prioritize exact matches or common aliases
         for branch_name in branch_names:
@@ -153,7 +250,7 @@ def resolve_git_user(user_query: str) -> str:
     error = _check_repo_connection()
     if error: return error.get("error")
 
-    print(f"[VC Tool] Resolving Git user for query: '{user_query}' in repo: {TARGET_REPO.full_name}")
+    logger.debug("[VC Tool] Resolving Git user for query: '%s' in repo: %s", user_query, TARGET_REPO.full_name)
     query_lower = user_query.lower()
 
     # PyGithub doesn't have a direct "list all users in a repo" API
@@ -164,7 +261,10 @@ def resolve_git_user(user_query: str) -> str:
         recent_commits = TARGET_REPO.get_commits() # Gets up to 30 by default
         for commit in recent_commits:
             author = commit.author
-            if author and (author.login.lower() in query_lower or author.name.lower() in query_lower):
+            # Match on the git author name already in the commit list payload.
+            # author.name would lazily fetch the user's profile: one extra API call per commit.
+            git_author_name = (commit.commit.author.name or "").lower()
+            if author and (author.login.lower() in query_lower or (git_author_name and git_author_name in query_lower)):
                 return author.login # Return GitHub username/login
         
         # Fallback to a predefined list if you have one
@@ -190,16 +290,13 @@ def get_commit_details(commit_id: str) -> dict:
     error = _check_repo_connection()
     if error: return error.get("error")
 
-    print(f"[VC Tool] Getting commit details for ID: {commit_id} in repo: {TARGET_REPO.full_name}")
+    logger.debug("[VC Tool] Getting commit details for ID: %s in repo: %s", commit_id, TARGET_REPO.full_name)
     try:
-        # PyGithub's get_commit can often resolve partial hashes if unique
-        commit = TARGET_REPO.get_commit(commit_id)
-        return {
-            "hash": commit.sha,
-            "author": commit.author.login if commit.author else "Unknown",
-            "message": commit.commit.message,
-            "timestamp": commit.commit.author.date.isoformat() + "Z" # ISO 8601 format
-        }
+        sha = commit_id.strip().lower()
+        if _FULL_SHA_RE.fullmatch(sha):
+            return dict(_fetch_commit_details_by_sha(sha)) # Copy so callers can't mutate the cache
+        # Partial hashes are resolved fresh, since they may become ambiguous later
+        return _fetch_commit_details(commit_id)
     except Exception as e:
         return {"error": f"Commit '{commit_id}' not found or API error: {e}"}
 
@@ -215,10 +312,9 @@ def list_available_branches() -> list:
     error = _check_repo_connection()
     if error: return error.get("error")
 
-    print(f"[VC Tool] Listing branches for repo: {TARGET_REPO.full_name}")
+    logger.debug("[VC Tool] Listing branches for repo: %s", TARGET_REPO.full_name)
     try:
-        branches = TARGET_REPO.get_branches()
-        return sorted([b.name for b in branches])
+        return list(_branch_names()) # Copy so callers can't mutate the cached list
     except Exception as e:
         return [f"Error listing branches from API: {e}"]
 
@@ -236,20 +332,12 @@ def list_recent_commits_on_branch(branch: str, num_commits: int = 5) -> list:
     error = _check_repo_connection()
     if error: return error.get("error")
 
-    print(f"[VC Tool] Listing {num_commits} recent commits for branch: {branch} in repo: {TARGET_REPO.full_name}")
+    logger.debug("[VC Tool] Listing %s recent commits for branch: %s in repo: %s", num_commits, branch, TARGET_REPO.full_name)
     try:
-        # Get commits for the specified branch, limit to num_commits
-        commits = TARGET_REPO.get_commits(sha=branch)[:num_commits] # sha=branch gets commits from head of branch
-        
-        results = []
-        for commit in commits:
-            results.append({
-                "hash": commit.sha,
-                "author": commit.author.login if commit.author else "Unknown",
-                "message": commit.commit.message,
-                "timestamp": commit.commit.author.date.isoformat() + "Z"
-            })
-        return results
+        # Resolve the branch head first (cheap, TTL-cached); the listing below it
+        # is only fetched again once the branch moves
+        head_sha = _branch_head_sha(branch)
+        return [dict(commit) for commit in _recent_commits_from(head_sha, num_commits)]
     except Exception as e:
         return [{"error": f"Error listing commits for branch '{branch}' from API: {e}"}]
 
@@ -266,7 +354,7 @@ def resolve_latest_commit(branch: str, user_query: Optional[str] = None) -> dict
         A dictionary containing the commit hash, author, message, and timestamp,
         or an error message if the branch/user/commit is not found.
     """
-    print(f"[VC Tool] Resolving latest commit for branch: {branch}")
+    logger.debug("[VC Tool] Resolving latest commit for branch: %s", branch)
 
     target_user_id = None
     if user_query:
@@ -275,7 +363,7 @@ def resolve_latest_commit(branch: str, user_query: Optional[str] = None) -> dict
         if "Unable to resolve" in resolved_user_id or "Error" in resolved_user_id:
             return {"error": f"Could not resolve user '{user_query}': {resolved_user_id}. Please try again."}
         target_user_id = resolved_user_id
-        print(f"[VC Tool] Resolved user '{user_query}' to '{target_user_id}'.")
+        logger.debug("[VC Tool] Resolved user '%s' to '%s'.", user_query, target_user_id)
 
 
     # --- Logic for fetching commits (replace with real API calls if not already) ---
@@ -306,8 +394,9 @@ def resolve_latest_commit(branch: str, user_query: Optional[str] = None) -> dict
         return {"error": f"No latest commit found on branch '{branch}'."}
 
 
-# List of all Version Control related functions to be passed as tools
-VERSION_CONTROL_TOOL_FUNCTIONS = [
+# List of all Version Control related functions to be passed as tools.
+# Each makes blocking GitHub API calls, so they run on a worker thread.
+VERSION_CONTROL_TOOL_FUNCTIONS = [run_in_thread(tool) for tool in (
     get_latest_commit_on_branch,
     resolve_branch_name,
     resolve_git_user,
@@ -315,4 +404,4 @@ VERSION_CONTROL_TOOL_FUNCTIONS = [
     list_available_branches,
     list_recent_commits_on_branch,
     resolve_latest_commit
-]
+)]